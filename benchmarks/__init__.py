@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for tcParser, run from the repository root:
+
+    python -m benchmarks.corpus   synthetic spec files
+    python -m benchmarks.runner   phase timings from 1k to 1M cases
+    python -m benchmarks.hooks    cost of the event hooks
+    python -m benchmarks.compare  regression gate against baseline.json
+    python -m benchmarks.startup  startup budget of a small run
+    python -m benchmarks.server   generation server round trips
+    python -m benchmarks.moztrap  tcUpload against a MozTrap API stub
+"""
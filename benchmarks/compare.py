@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""Performance regression gate against stored baselines.
+
+Every measurement runs in a fresh interpreter so peak RSS is per run.
+Each size is measured ``--repeat`` times: peak RSS of a CLI run into a
+folder, then whole generation, parsing, rendering and writing with the
+output kept in memory, since file system speed varies too much between
+runs to gate on.  The machine's own speed varies too, so each phase is
+timed against a fixed reference workload run right around it, and its
+throughput is kept in cases per reference run.  Allocations are traced
+in one more run of their own, so tracemalloc does not slow the timed
+ones.  Each metric is compared by its median run: it regresses when the
+median is more than ``--threshold`` worse than the baseline's.
+Baselines are kept per Python version and never compared across
+versions.
+
+    python -m benchmarks.compare              compare with baseline.json
+    python -m benchmarks.compare --update     record a new baseline
+
+Exit status is 1 when a regression is found, so it can gate a release.
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import corpus
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'baseline.json')
+
+# metric -> True when higher is better; the *_per_ref metrics are cases
+# handled in the time the reference workload takes (see ratio)
+METRICS = {'cases_per_ref': True, 'parse_per_ref': True,
+           'render_per_ref': True, 'write_per_ref': True,
+           'peak_rss_kib': False, 'alloc_peak_bytes_per_case': False}
+
+# each phase is timed INNER times, with the garbage collector off (like
+# timeit), every sample repeated for at least LEAST seconds
+INNER = 10
+LEAST = 0.1
+
+
+def reference():
+    # fixed interpreter work of the same kind as the phases: formatting,
+    # dicts, encoding and joining
+    d = {}
+    for i in range(20000):
+        d['k%d' % i] = ('<td>%s</td>' % i).encode('utf-8')
+    return b''.join(d.values())
+
+
+def sample(fn):
+    calls = 0
+    start = time.time()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.time() - start
+        if elapsed >= LEAST:
+            return elapsed / calls
+
+
+def ratio(fn):
+    """Best time of fn against the reference timed right before and after.
+
+    The machine's speed drifts by far more than any threshold worth
+    gating on, over seconds and over hours, but it drifts for both.
+    """
+    ratios = []
+    gc.collect()
+    gc.disable()
+    try:
+        for i in range(INNER):
+            before = sample(reference)
+            seconds = sample(fn)
+            ratios.append(seconds * 2 / (before + sample(reference)))
+    finally:
+        gc.enable()
+    return min(ratios)
+
+
+def child(size, work, alloc=False):
+    # one measurement, printed as JSON for the parent
+    from benchmarks import runner
+    import tcParser
+    options = argparse.Namespace(steps=3, tags=2, text=40, unicode=0.1,
+                                 seed=1)
+    if alloc:
+        try:
+            import tracemalloc
+        except ImportError:
+            print(json.dumps({'alloc_peak_bytes_per_case': None}))
+            return
+        tracemalloc.start()
+        runner.runOnce(size, options, work)
+        print(json.dumps({'alloc_peak_bytes_per_case':
+                          float(tracemalloc.get_traced_memory()[1]) / size}))
+        return
+    # a CLI run into a folder first, for its peak RSS; the filesystem's
+    # speed varies too much between runs to gate on, so the timings below
+    # keep the output in memory
+    runner.runOnce(size, options, work)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    spec = os.path.join(work, 'spec-%d' % size)
+    cases = []
+    docs = []
+    X = tcParser.xhtmlGenerator()
+    renderer = tcParser.XhtmlParser()
+
+    def generate():
+        tcParser.XhtmlParser(spec, tcParser.MemorySink())
+
+    def parse():
+        cases[:] = tcParser.FileParser(spec).testcases
+
+    def render():
+        docs[:] = [(str(i).zfill(6),
+                    renderer.caseRender(X, str(i).zfill(6), case))
+                   for i, case in enumerate(cases)]
+
+    def write():
+        sink = tcParser.StreamSink(io.BytesIO())
+        for fn, doc in docs:
+            tcParser.writeDocument(sink, fn, doc)
+        sink.close()
+
+    print(json.dumps({'cases_per_ref': size / ratio(generate),
+                      'parse_per_ref': size / ratio(parse),
+                      'render_per_ref': size / ratio(render),
+                      'write_per_ref': size / ratio(write),
+                      'peak_rss_kib': rss}))
+
+
+def measure(sizes, repeat, work):
+    samples = {}
+    for size in sizes:
+        corpus.write(os.path.join(work, 'spec-%d' % size), size, 3, 2, 40,
+                     0.1, 1)
+        runs = [run(size, work) for i in range(repeat)]
+        # allocations are deterministic, one traced run is enough
+        runs.append(run(size, work, '--alloc'))
+        samples[str(size)] = dict((m, [r[m] for r in runs if m in r])
+                                  for m in METRICS)
+        sys.stderr.write("measured %d cases x%d\n" % (size, repeat))
+    return samples
+
+
+def run(size, work, *flags):
+    out = subprocess.check_output(
+        [sys.executable, '-m', 'benchmarks.compare', '--child', str(size),
+         '--work', work] + list(flags),
+        cwd=os.path.dirname(os.path.dirname(BASELINE)))
+    return json.loads(out.decode('utf-8').splitlines()[-1])
+
+
+def version():
+    # baselines are only comparable within one interpreter version
+    return '%s.%s' % sys.version_info[:2]
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return (values[middle] + values[-middle - 1]) / 2.0
+
+
+def change(base, cur):
+    """Relative change of the median run, and the spread of the current
+    runs (range against median)."""
+    return ((median(cur) - median(base)) / float(median(base)),
+            (max(cur) - min(cur)) / float(median(cur)))
+
+
+def compare(baseline, current, threshold):
+    regressions = []
+    for size in sorted(current, key=int):
+        if size not in baseline:
+            print("%s cases: no baseline" % size)
+            continue
+        for metric, higherBetter in sorted(METRICS.items()):
+            base = [x for x in baseline[size].get(metric, []) if x is not None]
+            cur = [x for x in current[size].get(metric, []) if x is not None]
+            if not base or not cur:
+                continue
+            rel, spread = change(base, cur)
+            worse = rel < -threshold if higherBetter else rel > threshold
+            print("%8s %-26s %+7.1f%%  (spread %5.1f%%)%s" %
+                  (size, metric, rel * 100, spread * 100,
+                   '  REGRESSION' if worse else ''))
+            if worse:
+                regressions.append((size, metric, rel))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='5000,20000')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="tolerated relative slowdown, e.g. 0.10")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update', action='store_true',
+                        help="store the measurements as the new baseline")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--work', help=argparse.SUPPRESS)
+    parser.add_argument('--alloc', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child, args.work, args.alloc)
+
+    baselines = {}
+    if os.path.isfile(args.baseline):
+        f = open(args.baseline)
+        baselines = json.load(f)
+        f.close()
+    baseline = baselines.get(version())
+    if baseline is None and not args.update:
+        print("no baseline for Python %s (have: %s); record one with "
+              "--update" % (version(), ', '.join(sorted(baselines)) or
+                            'none'))
+        return 2
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    work = tempfile.mkdtemp(prefix='tcbench-')
+    try:
+        current = measure(sizes, args.repeat, work)
+    finally:
+        shutil.rmtree(work)
+
+    if args.update:
+        baselines[version()] = {'python': platform.python_version(),
+                                'machine': platform.machine(),
+                                'repeat': args.repeat,
+                                'samples': current}
+        f = open(args.baseline, 'w')
+        json.dump(baselines, f, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        f.write('\n')
+        f.close()
+        print("baseline for Python %s written: %s" % (version(),
+                                                      args.baseline))
+        return 0
+
+    regressions = compare(baseline['samples'], current, args.threshold)
+    if regressions:
+        print("%d regression(s) beyond %.0f%%" % (len(regressions),
+                                                  args.threshold * 100))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
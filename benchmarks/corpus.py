@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Deterministic generator of synthetic spec files.
+
+Writes cases in the PRODUCT/PRODUCTVERSION/SUITE/TITLE/DESCRIPTION/TAGS/
+STEP/EXPECTED/DONE format read by tcParser.FileParser. The same options
+and seed always give the same bytes, so results stay comparable between
+runs, machines and Python versions.
+
+    python -m benchmarks.corpus <output> [--cases N] [--steps N] [--tags N]
+                                         [--text N] [--unicode F] [--seed N]
+"""
+
+import argparse
+import io
+import random
+
+WORDS = [u'tap', u'launch', u'swipe', u'open', u'verify', u'homescreen',
+         u'settings', u'music', u'camera', u'gallery', u'contacts', u'call',
+         u'message', u'wifi', u'bluetooth', u'battery', u'screen', u'volume',
+         u'button', u'app', u'icon', u'menu', u'list', u'should', u'display',
+         u'correctly', u'after', u'before', u'device', u'user']
+UNICODE = [u'été', u'über', u'ça', u'жук',
+           u'αβγ', u'中文', u'日本語',
+           u'한국어', u'عربي', u'✓']
+PRODUCTS = [u'Firefox OS', u'Firefox', u'Marketplace']
+VERSIONS = [u'1.3+', u'1.4', u'2.0']
+SUITES = [u'Music', u'Camera', u'Gallery', u'Settings', u'Dialer', u'SMS',
+          u'Contacts', u'Browser']
+TAGS = [u'gaia', u'b2g', u'smoke', u'regression', u'music', u'camera',
+        u'media', u'ui', u'l10n', u'perf', u'network', u'storage']
+
+
+def pick(rng, seq):
+    # random.choice differs between Python versions, random() does not
+    return seq[int(rng.random() * len(seq))]
+
+
+def text(rng, length, unicodeMix):
+    # roughly `length` characters of words, some of them non-ASCII
+    words = []
+    size = 0
+    while size < length:
+        if unicodeMix and rng.random() < unicodeMix:
+            word = pick(rng, UNICODE)
+        else:
+            word = pick(rng, WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return u' '.join(words)
+
+
+def lines(cases=1000, steps=3, tags=2, length=40, unicodeMix=0.0, seed=1):
+    """Yields the spec line by line, so any size fits in memory."""
+    for chunk in chunks(cases, steps, tags, length, unicodeMix, seed):
+        for line in chunk[:-1].split(u'\n'):
+            yield line + u'\n'
+
+
+def chunks(cases, steps, tags, length, unicodeMix, seed):
+    # the spec in pieces of whole lines
+    rng = random.Random(seed)
+    for i in range(cases):
+        yield u'PRODUCT\n%s\n' % PRODUCTS[i % len(PRODUCTS)]
+        yield u'PRODUCTVERSION\n%s\n' % VERSIONS[(i // 7) % len(VERSIONS)]
+        yield u'SUITE\n%s\n' % pick(rng, SUITES)
+        yield u'TITLE\ncase %d %s\n' % (i, text(rng, length, unicodeMix))
+        yield u'DESCRIPTION\n%s\n%s\n' % (text(rng, length, unicodeMix),
+                                         text(rng, length, unicodeMix))
+        yield u'TAGS\n'
+        pool = list(TAGS)
+        for t in range(min(tags, len(pool))):
+            yield pool.pop(int(rng.random() * len(pool))) + u'\n'
+        for s in range(steps):
+            yield u'STEP\n%s\n' % text(rng, length, unicodeMix)
+            yield u'EXPECTED\n%s\n' % text(rng, length, unicodeMix)
+        yield u'DONE\n'
+
+
+def write(path, cases=1000, steps=3, tags=2, length=40, unicodeMix=0.0,
+          seed=1):
+    f = io.open(path, 'w', encoding='utf-8')
+    try:
+        for line in lines(cases, steps, tags, length, unicodeMix, seed):
+            f.write(line)
+    finally:
+        f.close()
+    return path
+
+
+def addOptions(parser):
+    parser.add_argument('--steps', type=int, default=3,
+                        help="steps per case")
+    parser.add_argument('--tags', type=int, default=2,
+                        help="tags per case")
+    parser.add_argument('--text', type=int, default=40,
+                        help="characters per text field")
+    parser.add_argument('--unicode', type=float, default=0.0,
+                        help="share of non-ASCII words, 0..1")
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output')
+    parser.add_argument('--cases', type=int, default=1000)
+    addOptions(parser)
+    args = parser.parse_args()
+    write(args.output, args.cases, args.steps, args.tags, args.text,
+          args.unicode, args.seed)
+
+
+if __name__ == "__main__":
+    main()
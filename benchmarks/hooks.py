@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Cost of the event hooks with and without registered callbacks.
+
+Compares the uninstrumented render call (caseRender) with the hooked one
+(timedRender), and parsing/writing with an empty registry against a
+registry holding a no-op callback for every event.
+
+    python -m benchmarks.hooks [--cases N] [--repeat R]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import tcParser
+from benchmarks import corpus
+
+
+def best(fn, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def noop(**payload):
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='tcbench-')
+    try:
+        spec = corpus.write(os.path.join(work, 'spec'), args.cases)
+
+        cases = tcParser.FileParser(spec).testcases
+        renderer = tcParser.XhtmlParser()
+        X = tcParser.xhtmlGenerator()
+        jobs = [(str(i).zfill(6), c) for i, c in enumerate(cases)]
+
+        def plain():
+            for fn, case in jobs:
+                renderer.caseRender(X, fn, case)
+
+        def hooked():
+            for fn, case in jobs:
+                renderer.timedRender(X, fn, case)
+
+        def parse():
+            tcParser.FileParser(spec)
+
+        def generate():
+            tcParser.XhtmlParser(spec, os.path.join(work, 'out'))
+
+        results = []
+        tcParser.hooks.clear()
+        results.append(('render, uninstrumented', best(plain, args.repeat)))
+        results.append(('render, no hooks', best(hooked, args.repeat)))
+        results.append(('parse, no hooks', best(parse, args.repeat)))
+        results.append(('generate, no hooks', best(generate, args.repeat)))
+        for event in tcParser.Hooks.EVENTS:
+            tcParser.hooks.register(event, noop)
+        results.append(('render, no-op hooks', best(hooked, args.repeat)))
+        results.append(('parse, no-op hooks', best(parse, args.repeat)))
+        results.append(('generate, no-op hooks', best(generate, args.repeat)))
+        tcParser.hooks.clear()
+
+        for name, seconds in results:
+            print("%-24s %8.4fs  %8.2f us/case" %
+                  (name, seconds, seconds * 1e6 / len(cases)))
+        overhead = results[1][1] - results[0][1]
+        print("hook check overhead: %.3f us/case (%.2f%%)" %
+              (overhead * 1e6 / len(cases), 100.0 * overhead / results[0][1]))
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == "__main__":
+    main()
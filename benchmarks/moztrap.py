@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""Local MozTrap API stub and upload throughput of tcUpload.
+
+The stub answers the calls tcUpload makes: product, productversion and
+suite lookups (created on first request), tag lookups, and ``POST`` of
+tags, cases, caseversions, casesteps and suitecases.  Posted objects are
+checked like MozTrap's resources check them: required and unknown
+fields, and foreign keys that must name existing objects.
+
+``--fail-rate`` makes that share of POSTs fail: half are refused with 503
+before anything happens, half are applied and then answered with 502, as
+when a proxy loses the response.
+
+    python -m benchmarks.moztrap [--cases N] [--concurrency N] ...
+    python -m benchmarks.moztrap --serve [--port 8000]
+
+The benchmark uploads a synthetic corpus twice and checks that the
+second run sends nothing and the stub holds exactly one caseversion per
+case, with one step per step number and one suite membership.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from urlparse import urlparse, parse_qsl
+except ImportError:
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qsl
+
+import tcParser
+import tcServer
+import tcUpload
+from benchmarks import corpus
+
+# kind -> (required fields, optional fields); references are resource URIs
+FIELDS = {
+    'tag': (('name',), ('product', 'description')),
+    'case': (('product',), ('idprefix', 'priority')),
+    'caseversion': (('case', 'productversion', 'name', 'status'),
+                    ('description', 'tags')),
+    'casestep': (('caseversion', 'number', 'instruction'), ('expected',)),
+    'suitecase': (('case', 'suite'), ('order',)),
+}
+REFERENCES = ('product', 'productversion', 'suite', 'case', 'caseversion')
+LOOKUPS = ('product', 'productversion', 'suite')
+
+
+class Store:
+    """What the stub server has been sent."""
+
+    def __init__(self, failRate=0.0, apiKey=None):
+        self.failRate = failRate
+        self.apiKey = apiKey
+        self.objects = dict((kind, []) for kind in FIELDS)
+        # (kind, field, filter value) -> records, for the lookups
+        self.index = {}
+        self.lookups = {}
+        self.requests = 0
+        self.refused = 0
+        self.lost = 0
+        self.lock = threading.Lock()
+
+    def uri(self, kind, objectId):
+        return '%s%s/%d/' % (tcUpload.API, kind, objectId)
+
+    def lookup(self, kind, query):
+        key = (kind, tuple(sorted(query.items())))
+        with self.lock:
+            if key not in self.lookups:
+                self.lookups[key] = self.uri(kind, len(self.lookups) + 1)
+            return self.lookups[key]
+
+    def exists(self, uri):
+        if not isinstance(uri, str) and not isinstance(uri, type(u'')):
+            return False
+        kind = uri[len(tcUpload.API):].split('/')[0]
+        if kind in LOOKUPS:
+            return uri in self.lookups.values()
+        objectId = tcUpload.uriId(uri)
+        return kind in self.objects and objectId.isdigit() and \
+            0 < int(objectId) <= len(self.objects[kind])
+
+    def create(self, kind, data):
+        # (uri, None) or (None, error)
+        required, optional = FIELDS[kind]
+        missing = [f for f in required if data.get(f) in (None, '')]
+        unknown = [f for f in data if f not in required + optional]
+        if missing or unknown:
+            return None, "missing %s, unknown %s" % (missing, unknown)
+        with self.lock:
+            refs = [data[f] for f in REFERENCES if f in data]
+            refs.extend(data.get('tags') or [])
+            bad = [ref for ref in refs if not self.exists(ref)]
+            if bad:
+                return None, "no such objects: %s" % bad
+            objects = self.objects[kind]
+            record = dict(data)
+            record['resource_uri'] = self.uri(kind, len(objects) + 1)
+            objects.append(record)
+            for field, value in record.items():
+                if field in REFERENCES:
+                    value = tcUpload.uriId(value)
+                self.index.setdefault((kind, field, str(value)),
+                                      []).append(record)
+            return record['resource_uri'], None
+
+    def filter(self, kind, query):
+        # exact matches; references are filtered by id
+        with self.lock:
+            if query:
+                field, value = sorted(query.items())[0]
+                objects = list(self.index.get((kind, field, value), []))
+            else:
+                objects = list(self.objects[kind])
+        out = []
+        for record in objects:
+            for field, value in query.items():
+                have = record.get(field)
+                if field in REFERENCES:
+                    have = tcUpload.uriId(have) if have else None
+                if str(have) != value:
+                    break
+            else:
+                out.append(record)
+        return out
+
+    def check(self, cases):
+        # problems found against the parsed cases, [] when all is well
+        problems = []
+        versions = self.objects['caseversion']
+        if len(versions) != len(cases):
+            problems.append("%d caseversions for %d cases" %
+                            (len(versions), len(cases)))
+        steps = {}
+        for step in self.objects['casestep']:
+            steps.setdefault(step['caseversion'], []).append(step['number'])
+        for version in versions:
+            numbers = sorted(steps.get(version['resource_uri'], []))
+            if numbers != list(range(1, len(numbers) + 1)):
+                problems.append("steps %s of %s" % (numbers,
+                                                    version['resource_uri']))
+        memberships = [(m['case'], m['suite'])
+                       for m in self.objects['suitecase']]
+        if len(set(memberships)) != len(memberships):
+            problems.append("duplicate suite memberships")
+        tags = [(t.get('product'), t['name']) for t in self.objects['tag']]
+        if len(set(tags)) != len(tags):
+            problems.append("duplicate tags")
+        return problems
+
+    def stats(self):
+        stats = dict((kind + 's', len(objects))
+                     for kind, objects in self.objects.items())
+        stats.update({'requests': self.requests, 'refused': self.refused,
+                      'lost': self.lost})
+        return stats
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        store = self.server.store
+        if url.path == '/stats':
+            return self.reply(200, store.stats())
+        query = self.query(url)
+        if query is None:
+            return
+        kind = self.kind(url)
+        if kind in LOOKUPS:
+            objects = [{'resource_uri': store.lookup(kind, query)}]
+        elif kind in FIELDS:
+            objects = store.filter(kind, query)
+        else:
+            return self.reply(404, {'error': 'not found'})
+        self.reply(200, {'meta': {'total_count': len(objects)},
+                         'objects': objects})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        store = self.server.store
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if self.query(url) is None:
+            return
+        kind = self.kind(url)
+        if kind not in FIELDS:
+            return self.reply(405, {'error': 'method not allowed'})
+        roll = random.random()
+        if roll < store.failRate / 2:
+            with store.lock:
+                store.refused += 1
+            return self.reply(503, {'error': 'try again'})
+        uri, error = store.create(kind, json.loads(body.decode('utf-8')))
+        if error:
+            return self.reply(400, {'error': error})
+        if roll < store.failRate:
+            with store.lock:
+                store.lost += 1
+            return self.reply(502, {'error': 'bad gateway'})
+        self.reply(201, None, uri)
+
+    def setup(self):
+        # answers go out as headers and body; no waiting for delayed ACKs
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        BaseHTTPRequestHandler.setup(self)
+
+    def kind(self, url):
+        if not url.path.startswith(tcUpload.API):
+            return None
+        return url.path[len(tcUpload.API):].strip('/')
+
+    def query(self, url):
+        # filters of the request; None after answering a bad api key
+        query = dict(parse_qsl(url.query))
+        with self.server.store.lock:
+            self.server.store.requests += 1
+        if self.server.store.apiKey and \
+                query.pop('api_key', None) != self.server.store.apiKey:
+            self.reply(401, {'error': 'bad api key'})
+            return None
+        query.pop('api_key', None)
+        query.pop('username', None)
+        return query
+
+    def reply(self, code, data, location=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if location:
+            self.send_header('Location', 'http://%s%s' % (
+                self.headers.get('Host', 'localhost'), location))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def makeStub(port=0, workers=8, failRate=0.0, apiKey=None):
+    server = tcServer.TCPServer(('127.0.0.1', port), StubHandler)
+    server.workers = workers
+    server.store = Store(failRate, apiKey)
+    server.startWorkers()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--serve', action='store_true',
+                        help="only run the stub server")
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--cases', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = makeStub(args.port, max(8, args.concurrency), args.fail_rate)
+    url = 'http://127.0.0.1:%d' % server.server_address[1]
+    if args.serve:
+        print("stub MozTrap API on %s" % url)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    cases = tcParser.FileParser(lines=corpus.lines(args.cases)).testcases
+    fd, ledgerPath = tempfile.mkstemp(prefix='tcupload-')
+    os.close(fd)
+    try:
+        results = []
+        for run in ('first', 'rerun'):
+            client = tcUpload.Client(url, 'bench', 'key', backoff=0.01)
+            ledger = tcUpload.Ledger(ledgerPath, url)
+            try:
+                result = tcUpload.Uploader(client, ledger,
+                                           args.concurrency).upload(cases)
+            finally:
+                ledger.close()
+            results.append(result)
+            print("%-5s  sent %6d  skipped %6d  requests %6d  retries %4d  "
+                  "resolved %4d  %8.1f cases/s" % (
+                      run, result['sent'], result['skipped'],
+                      result['requests'], result['retries'],
+                      result['resolved'], result['cases_per_second']))
+    finally:
+        os.remove(ledgerPath)
+        server.shutdown()
+        server.server_close()
+    stats = server.store.stats()
+    print("stub: %(cases)d cases, %(caseversions)d caseversions, "
+          "%(casesteps)d steps, %(tags)d tags, %(requests)d requests, "
+          "%(refused)d refused, %(lost)d lost" % stats)
+    problems = server.store.check(cases)
+    if results[1]['sent']:
+        problems.append("the rerun sent %d cases" % results[1]['sent'])
+    for problem in problems:
+        print(problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
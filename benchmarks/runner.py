@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Times parsing, rendering, writing and suite generation per corpus size.
+
+Each size gets a fresh synthetic corpus (see benchmarks.corpus) and a full
+tcParser.XhtmlParser run with a RunStats attached; the phase times come
+from that report.
+
+    python -m benchmarks.runner [--sizes 1000,10000,...] [--json FILE]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import tcParser
+from benchmarks import corpus
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+
+def runOnce(size, options, work, pipeline=False):
+    spec = os.path.join(work, 'spec-%d' % size)
+    if not os.path.isfile(spec):
+        corpus.write(spec, size, options.steps, options.tags, options.text,
+                     options.unicode, options.seed)
+    out = os.path.join(work, 'out-%d' % size)
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    stats = tcParser.RunStats()
+    start = time.time()
+    tcParser.XhtmlParser(spec, out, pipeline=pipeline, stats=stats)
+    wall = time.time() - start
+    shutil.rmtree(out)
+    report = stats.report()
+    result = {'cases': size, 'wall_s': round(wall, 4),
+              'cases_per_s': round(size / wall, 2) if wall > 0 else 0.0,
+              'bytes_written': report['bytes_written']}
+    for name, phase in report['phases'].items():
+        result[name + '_s'] = phase['wall_s']
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000',
+                        help="comma separated case counts, up to %d" %
+                             SIZES[-1])
+    parser.add_argument('--pipeline', action='store_true',
+                        help="use the background writer")
+    parser.add_argument('--json', metavar='FILE',
+                        help="also write the results as JSON")
+    parser.add_argument('--work', help="folder for corpora (kept)")
+    corpus.addOptions(parser)
+    args = parser.parse_args()
+
+    work = args.work or tempfile.mkdtemp(prefix='tcbench-')
+    if not os.path.isdir(work):
+        os.makedirs(work)
+    results = []
+    try:
+        print("%9s %9s %8s %8s %8s %8s %8s %10s" %
+              ('cases', 'wall', 'read', 'parse', 'render', 'write', 'suite',
+               'cases/s'))
+        for size in [int(s) for s in args.sizes.split(',')]:
+            r = runOnce(size, args, work, args.pipeline)
+            results.append(r)
+            print("%9d %8.3fs %7.3fs %7.3fs %7.3fs %7.3fs %7.3fs %10.1f" %
+                  (r['cases'], r['wall_s'], r['read_s'], r['parse_s'],
+                   r['render_s'], r['write_s'], r['suite_s'],
+                   r['cases_per_s']))
+    finally:
+        if not args.work:
+            shutil.rmtree(work)
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.close()
+
+
+if __name__ == "__main__":
+    main()
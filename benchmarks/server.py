@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Round-trip latency of the generation server.
+
+Starts tcServer in-process on a free port and times repeated
+``POST /generate`` requests of a spec over one keep-alive connection,
+against a cold ``python tcParser.py`` run of the same spec.
+
+    python -m benchmarks.server [--spec FILE] [--requests N]
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+try:
+    from httplib import HTTPConnection
+except ImportError:
+    from http.client import HTTPConnection
+
+import tcServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(ROOT, 'samples', 'sample')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--spec', default=SAMPLE)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+    body = open(args.spec, 'rb').read()
+
+    server = tcServer.makeServer(port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    conn = HTTPConnection('127.0.0.1', server.server_address[1])
+    conn.connect()
+    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    times = []
+    try:
+        for i in range(args.requests):
+            start = time.time()
+            conn.request('POST', '/generate', body)
+            response = conn.getresponse()
+            response.read()
+            times.append(time.time() - start)
+            if response.status != 200:
+                print("request failed: %d" % response.status)
+                return 1
+    finally:
+        conn.close()
+        server.shutdown()
+        server.server_close()
+
+    out = tempfile.mkdtemp(prefix='tcserver-')
+    try:
+        start = time.time()
+        subprocess.check_call([sys.executable, 'tcParser.py', args.spec,
+                               os.path.join(out, 'cases'), '-q'], cwd=ROOT)
+        cold = time.time() - start
+    finally:
+        shutil.rmtree(out)
+
+    first = times[0]
+    times.sort()
+    print("cold tcParser.py run   %8.2f ms" % (cold * 1000))
+    print("first request          %8.2f ms" % (first * 1000))
+    print("warm request median    %8.2f ms" % (times[len(times) // 2] * 1000))
+    print("warm request p95       %8.2f ms" %
+          (times[int(len(times) * 0.95)] * 1000))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
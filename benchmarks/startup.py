@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Startup budget of a small tcParser run.
+
+Times complete ``python tcParser.py <spec> <output> -q`` runs on the
+bundled sample against a bare interpreter start, and lists the slowest
+imports from ``python -X importtime`` where the interpreter has it
+(Python 3.7+).
+
+    python -m benchmarks.startup [--runs N] [--budget-ms MS] [--json FILE]
+
+Exits 1 when the median time above the bare interpreter start exceeds
+the budget.  The budget is kept per Python major version, since Python 3
+loads more at start-up for the same imports (``logging`` alone takes
+some 9 ms on 3.11); ``--budget-ms`` overrides it.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(ROOT, 'samples', 'sample')
+
+# median ms above a bare interpreter, per major version
+BUDGETS = {2: 40.0, 3: 70.0}
+
+
+def timed(cmds, runs):
+    # rounds of every command in turn, so drift slows them alike
+    times = [[] for cmd in cmds]
+    for i in range(runs):
+        for cmd, samples in zip(cmds, times):
+            start = time.time()
+            subprocess.check_call(cmd, cwd=ROOT)
+            samples.append(time.time() - start)
+    return times
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def importTimes(top):
+    # [(cumulative us, self us, module)] for ``import tcParser``
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c',
+                             'import tcParser'], cwd=ROOT,
+                            stderr=subprocess.PIPE)
+    err = proc.communicate()[1].decode('utf-8', 'replace')
+    if proc.returncode != 0 or 'import time:' not in err:
+        return None
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        rows.append((int(fields[1]), int(fields[0]), fields[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float,
+                        default=BUDGETS.get(sys.version_info[0]),
+                        help="allowed median on top of a bare interpreter")
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--json', metavar='FILE')
+    args = parser.parse_args()
+
+    out = tempfile.mkdtemp(prefix='tcstartup-')
+    try:
+        bare, imp, tool = timed([
+            [sys.executable, '-c', 'pass'],
+            [sys.executable, '-c', 'import tcParser'],
+            [sys.executable, 'tcParser.py', SAMPLE,
+             os.path.join(out, 'cases'), '-q']], args.runs)
+    finally:
+        shutil.rmtree(out)
+
+    # medians of each round's time above that round's bare start
+    result = {'python': sys.version.split()[0],
+              'bare_ms': round(median(bare) * 1000, 2),
+              'import_ms': round(median([i - b for i, b
+                                         in zip(imp, bare)]) * 1000, 2),
+              'run_ms': round(median([t - b for t, b
+                                      in zip(tool, bare)]) * 1000, 2),
+              'run_min_ms': round((min(tool) - min(bare)) * 1000, 2),
+              'budget_ms': args.budget_ms}
+    print("interpreter start      %7.1f ms" % result['bare_ms'])
+    print("import tcParser        %7.1f ms (median, above interpreter)" %
+          result['import_ms'])
+    print("sample run             %7.1f ms (median, above interpreter)" %
+          result['run_ms'])
+    rows = importTimes(args.top)
+    if rows is not None:
+        result['imports'] = [{'module': m, 'cumulative_us': c, 'self_us': s}
+                             for c, s, m in rows]
+        print("slowest imports (cumulative us, self us):")
+        for c, s, m in rows:
+            print("  %8d %8d  %s" % (c, s, m))
+    if args.json:
+        f = open(args.json, 'w')
+        json.dump(result, f, indent=2, sort_keys=True, separators=(',', ': '))
+        f.close()
+    if result['run_ms'] > args.budget_ms:
+        print("over budget: %.1f ms > %.1f ms" % (result['run_ms'],
+                                                  args.budget_ms))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
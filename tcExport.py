@@ -0,0 +1,517 @@
+# -*- coding: utf-8 -*-
+
+"""Writes parsed test cases in formats other than Selenese HTML.
+
+    python tcExport.py <input> <output|-> --format import|side|pytest
+
+``import``: one JSON document for a bulk import, see ImportExport.
+``side``: Selenium IDE project(s), see SideExport.
+``pytest``: a folder of WebDriver test modules, see PytestExport.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+from array import array
+
+import tcParser
+
+log = tcParser.log
+
+
+def _ascii(data):
+    # json.dumps escapes everything outside ASCII
+    return data.encode('ascii') if not isinstance(data, bytes) else data
+
+
+def _utf8(text):
+    return text.encode('utf-8') if not isinstance(text, bytes) else text
+
+
+### Bulk Import Document
+class ImportExport(tcParser.FileParser):
+    """Streams a spec into one JSON bulk import document.
+
+    Cases are grouped by product, version and suite; tags and steps are
+    listed once at the top and cases refer to them by position::
+
+        {"format": "tcparser-import", "version": 1, "cases": N,
+         "tags": ["music", ...],
+         "steps": [{"expected": ..., "instruction": ...}, ...],
+         "products": [{"name": ..., "versions": [{"version": ...,
+             "suites": [{"name": ..., "cases": [{"description": ...,
+                 "name": ..., "steps": [0, 1], "tags": [0, 2]}]}]}]}]}
+
+    Parsed cases are not kept: case records and step texts are spooled
+    to temporary files as they are parsed, and only the tag table, step
+    digests and per-group file offsets stay in memory.
+    """
+
+    def __init__(self, filename=None, caseFilter=None, lines=None,
+                 spoolFolder=None):
+        self.spool = tempfile.TemporaryFile(dir=spoolFolder)
+        self.stepSpool = tempfile.TemporaryFile(dir=spoolFolder)
+        self.tags = {}
+        self.tagList = []
+        self.steps = {}
+        self.groups = {}
+        self.count = 0
+        tcParser.FileParser.__init__(self, filename, caseFilter, lines=lines)
+
+    def caseParsed(self, case):
+        record = json.dumps({'name': case.title,
+                             'description': case.description,
+                             'tags': [self.tagId(tag) for tag in case.tags],
+                             'steps': [self.stepId(instruction, expected)
+                                       for instruction, expected
+                                       in case.steps]}, sort_keys=True)
+        key = (case.product, case.productversion, case.suite)
+        offsets = self.groups.get(key)
+        if offsets is None:
+            offsets = self.groups[key] = array('l')
+        offsets.append(self.spool.tell())
+        self.spool.write(_ascii(record) + b'\n')
+        self.count += 1
+
+    def tagId(self, tag):
+        tagId = self.tags.get(tag)
+        if tagId is None:
+            tagId = self.tags[tag] = len(self.tagList)
+            self.tagList.append(tag)
+        return tagId
+
+    def stepId(self, instruction, expected):
+        digest = hashlib.md5(_utf8(instruction) + b'\0' +
+                             _utf8(expected)).digest()
+        stepId = self.steps.get(digest)
+        if stepId is None:
+            stepId = self.steps[digest] = len(self.steps)
+            self.stepSpool.write(_ascii(json.dumps(
+                {'instruction': instruction, 'expected': expected},
+                sort_keys=True)) + b'\n')
+        return stepId
+
+    def write(self, out):
+        # out: a binary file object
+        out.write(_ascii('{"format": "tcparser-import", "version": 1, '
+                         '"cases": %d,\n"tags": %s,\n"steps": [' %
+                         (self.count, json.dumps(self.tagList))))
+        self.stepSpool.seek(0)
+        self.copy(self.stepSpool, out, len(self.steps))
+        out.write(b'],\n"products": [')
+        groups = sorted(self.groups)
+        products = []
+        for key in groups:
+            if not products or products[-1][0] != key[0]:
+                products.append((key[0], []))
+            versions = products[-1][1]
+            if not versions or versions[-1][0] != key[1]:
+                versions.append((key[1], []))
+            versions[-1][1].append(key)
+        for p, (product, versions) in enumerate(products):
+            out.write(_ascii('%s\n{"name": %s, "versions": [' % (
+                ',' if p else '', json.dumps(product))))
+            for v, (version, keys) in enumerate(versions):
+                out.write(_ascii('%s\n {"version": %s, "suites": [' % (
+                    ',' if v else '', json.dumps(version))))
+                for s, key in enumerate(keys):
+                    out.write(_ascii('%s\n  {"name": %s, "cases": [' % (
+                        ',' if s else '', json.dumps(key[2]))))
+                    self.cases(self.groups[key], out)
+                    out.write(b']}')
+                out.write(b']}')
+            out.write(b']}')
+        out.write(b'\n]}\n')
+        self.spool.close()
+        self.stepSpool.close()
+
+    def copy(self, spool, out, count):
+        # spooled JSON lines as array items
+        for i in range(count):
+            out.write(b',\n   ' if i else b'\n   ')
+            out.write(spool.readline()[:-1])
+
+    def cases(self, offsets, out):
+        # cases of one group, seeking only where another group intervenes
+        spool = self.spool
+        position = None
+        for i, offset in enumerate(offsets):
+            if offset != position:
+                spool.seek(offset)
+            line = spool.readline()
+            position = offset + len(line)
+            out.write(b',\n   ' if i else b'\n   ')
+            out.write(line[:-1])
+
+
+### Selenium IDE Project
+# blocks every case program starts and ends with
+PROLOGUE = (('open', '/manage/cases/', ''),
+            ('clickAndWait', 'link=create a test case', ''))
+EPILOGUE = (('select', 'id=id_status', 'label=draft'),
+            ('clickAndWait', 'name=save', ''))
+
+
+class SideExport(tcParser.FileParser):
+    """Streams a spec into Selenium IDE ``.side`` projects.
+
+    Every case becomes a test, written to disk as soon as it is parsed;
+    the ``testSuite`` suite lists them in order.  Blocks repeated across
+    cases (opening the form, saving, adding a tag) are written once as
+    shared tests and invoked with ``run``.  With ``splitSize`` a new
+    project (``name-2.side``, ...) is started once one reaches that many
+    bytes; each carries the shared tests it uses.
+    """
+
+    def __init__(self, filename=None, output='testCases.side',
+                 caseFilter=None, lines=None, url='https://moztrap.mozilla.org',
+                 splitSize=None, optimize=False):
+        self.output = output
+        self.url = url
+        self.splitSize = splitSize
+        self.optimize = optimize
+        self.files = []
+        self.out = None
+        self.count = 0
+        self.ids = 0
+        tcParser.FileParser.__init__(self, filename, caseFilter, lines=lines)
+        if self.out is None:
+            self.open()
+        self.close()
+
+    def newId(self):
+        # uuid shaped, deterministic
+        self.ids += 1
+        return '%08x-0000-4000-8000-%012x' % (len(self.files), self.ids)
+
+    def open(self):
+        if self.output == '-':
+            self.out = getattr(sys.stdout, 'buffer', sys.stdout)
+            path = '-'
+        else:
+            base, ext = os.path.splitext(self.output)
+            path = self.output if not self.files else \
+                '%s-%d%s' % (base, len(self.files) + 1, ext or '.side')
+            self.out = open(path, 'wb')
+        self.files.append(path)
+        name = os.path.splitext(os.path.basename(path))[0] or 'testCases'
+        self.size = 0
+        self.written = 0
+        self.tests = []
+        self.shared = {}
+        self.emit('{"id": "%s", "version": "2.0", "name": %s, "url": %s, '
+                  '"urls": [%s], "plugins": [],\n"tests": [' %
+                  (self.newId(), json.dumps(name), json.dumps(self.url),
+                   json.dumps(self.url)))
+
+    def close(self):
+        for block, (name, testId) in sorted(self.shared.items(),
+                                            key=lambda item: item[1]):
+            self.test(testId, name, block)
+        self.emit('],\n"suites": [{"id": "%s", "name": "testSuite", '
+                  '"persistSession": false, "parallel": false, '
+                  '"timeout": 300, "tests": [%s]}]}\n' %
+                  (self.newId(), ', '.join(['"%s"' % t for t in self.tests])))
+        if self.output != '-':
+            self.out.close()
+        self.out = None
+
+    def emit(self, text):
+        data = _ascii(text)
+        self.out.write(data)
+        self.size += len(data)
+
+    def caseParsed(self, case):
+        if self.out is None:
+            self.open()
+        elif self.splitSize and self.size >= self.splitSize and \
+                self.output != '-':
+            self.close()
+            self.open()
+        commands = case.commands()
+        if self.optimize:
+            commands = tcParser.optimizeCommands(commands)
+        testId = self.newId()
+        self.tests.append(testId)
+        # named like RunHistory reads case files back from the results
+        self.test(testId, '%s [%s]' % (case.title, str(self.count).zfill(6)),
+                  self.share(commands))
+        self.count += 1
+
+    def test(self, testId, name, commands):
+        rows = ['{"id": "%s", "comment": "", "command": %s, "target": %s, '
+                '"targets": [], "value": %s}' %
+                (self.newId(), json.dumps(command), json.dumps(target),
+                 json.dumps(value)) for command, target, value in commands]
+        self.emit('%s\n {"id": "%s", "name": %s, "commands": [\n  %s]}' %
+                  (',' if self.written else '', testId, json.dumps(name),
+                   ',\n  '.join(rows)))
+        self.written += 1
+
+    def share(self, commands):
+        # replace the blocks cases repeat by runs of shared tests
+        out = []
+        start, end = 0, len(commands)
+        if commands[:2] == PROLOGUE:
+            out.append(self.run('open case form', PROLOGUE))
+            start = 2
+        if commands[-2:] == EPILOGUE:
+            end -= 2
+        i = start
+        while i < end:
+            command, target, value = commands[i]
+            if target == 'id=id_add_tags':
+                link = 'link=%s [tag]' % value
+                j = i + 1
+                while j < end and commands[j][1] == link:
+                    j += 1
+                out.append(self.run('add tag ' + value, commands[i:j]))
+                i = j
+                continue
+            out.append(commands[i])
+            i += 1
+        if end < len(commands):
+            out.append(self.run('save case', EPILOGUE))
+        return out
+
+    def run(self, name, block):
+        block = tuple(block)
+        if block not in self.shared:
+            self.shared[block] = ('tcParser: ' + name, self.newId())
+        return ('run', self.shared[block][0], '')
+
+
+### WebDriver Test Modules
+PYTEST_CONFTEST = '''# -*- coding: utf-8 -*-
+"""Shared WebDriver session for the generated MozTrap suites.
+
+    TCPARSER_BASE_URL=https://moztrap.example.com pytest -n 4 .
+
+TCPARSER_BROWSER picks the webdriver class (default Firefox) and
+TCPARSER_TIMEOUT the explicit wait limit in seconds.
+"""
+
+import os
+
+import pytest
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import Select, WebDriverWait
+
+BASE_URL = os.environ.get('TCPARSER_BASE_URL', %(url)s).rstrip('/')
+TIMEOUT = float(os.environ.get('TCPARSER_TIMEOUT', '30'))
+
+
+class MozTrap:
+    """Fills MozTrap's case form, waiting for conditions, never sleeping."""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.wait = WebDriverWait(driver, TIMEOUT)
+
+    def find(self, by, value):
+        return self.wait.until(EC.presence_of_element_located((by, value)))
+
+    def click(self, by, value):
+        self.wait.until(EC.element_to_be_clickable((by, value))).click()
+
+    def type(self, field, text):
+        element = self.find(By.ID, field)
+        element.clear()
+        element.send_keys(text)
+
+    def select(self, field, label):
+        # options of dependent fields arrive after the field itself
+        def option(driver):
+            select = Select(self.find(By.ID, field))
+            return select if [o for o in select.options
+                              if o.text == label] else False
+        self.wait.until(option).select_by_visible_text(label)
+
+    def submit(self, name):
+        button = self.find(By.NAME, name)
+        button.click()
+        self.wait.until(EC.staleness_of(button))
+
+    def create_case(self, product, version, suite, title, description, tags,
+                    steps):
+        self.driver.get(BASE_URL + '/manage/cases/')
+        self.click(By.LINK_TEXT, 'create a test case')
+        self.select('id_product', product)
+        self.select('id_productversion', version)
+        self.select('id_suite', suite)
+        self.type('id_name', title)
+        self.type('id_description', description)
+        for tag in tags:
+            self.type('id_add_tags', tag)
+            self.click(By.LINK_TEXT, tag + ' [tag]')
+        for index, (instruction, expected) in enumerate(steps):
+            # clicking a step's instruction adds the next row
+            self.click(By.ID, 'id_steps-%%d-instruction' %% index)
+            self.type('id_steps-%%d-instruction' %% index, instruction)
+            if expected:
+                self.type('id_steps-%%d-expected' %% index, expected)
+        self.select('id_status', 'draft')
+        self.submit('save')
+
+
+@pytest.fixture(scope='session')
+def moztrap():
+    # one browser per session; pytest-xdist gives each worker its own
+    driver = getattr(webdriver, os.environ.get('TCPARSER_BROWSER', 'Firefox'))()
+    try:
+        yield MozTrap(driver)
+    finally:
+        driver.quit()
+'''
+
+PYTEST_MODULE = '''# -*- coding: utf-8 -*-
+"""Cases of one MozTrap suite, generated by tcParser."""
+
+import pytest
+
+SUITE = %(suite)s
+
+CASES = [
+%(rows)s]
+
+
+@pytest.mark.parametrize(
+    'product, version, title, description, tags, steps', CASES)
+def test_create_case(moztrap, product, version, title, description, tags,
+                     steps):
+    moztrap.create_case(product, version, SUITE, title, description, tags,
+                        steps)
+'''
+
+
+def _literal(value):
+    # JSON strings and lists are Python literals too
+    return json.dumps(value, ensure_ascii=False)
+
+
+class PytestExport(tcParser.FileParser):
+    """Writes one pytest module of WebDriver tests per MozTrap suite.
+
+    Each module holds a table of its cases (product, version, title,
+    description, tags, steps) fed to a single parametrized test, and
+    ``conftest.py`` fills the form through one shared driver, with
+    explicit waits in place of ``clickAndWait`` and
+    ``waitForElementPresent``.  Test ids are the case file names of the
+    HTML output, so ``-k 000042`` runs one case.
+    """
+
+    def __init__(self, filename=None, folder='testCases', caseFilter=None,
+                 lines=None, url='https://moztrap.mozilla.org'):
+        self.folder = folder
+        self.url = url
+        self.suites = {}
+        self.suiteOrder = []
+        self.count = 0
+        tcParser.FileParser.__init__(self, filename, caseFilter, lines=lines)
+        self.files = self.write()
+
+    def caseParsed(self, case):
+        rows = self.suites.get(case.suite)
+        if rows is None:
+            rows = self.suites[case.suite] = []
+            self.suiteOrder.append(case.suite)
+        rows.append('    pytest.param(%s, %s, %s, %s,\n'
+                    '                 %s,\n'
+                    '                 %s,\n'
+                    '                 id=%s),\n' % (
+                        _literal(case.product), _literal(case.productversion),
+                        _literal(case.title), _literal(case.description),
+                        _literal(list(case.tags)),
+                        _literal([list(step) for step in case.steps]),
+                        _literal(str(self.count).zfill(6))))
+        self.count += 1
+
+    def write(self):
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        files = [self.writeModule('conftest.py', PYTEST_CONFTEST % {
+            'url': repr(str(self.url))})]
+        names = set()
+        for suite in self.suiteOrder:
+            slug = re.sub(r'[^0-9a-z]+', '_', suite.lower()).strip('_') or \
+                'nosuite'
+            name, n = slug, 1
+            while name in names:
+                n += 1
+                name = '%s_%d' % (slug, n)
+            names.add(name)
+            rows = self.suites.pop(suite)
+            files.append(self.writeModule('test_%s.py' % name, PYTEST_MODULE % {
+                'suite': _literal(suite), 'rows': ''.join(rows)}))
+        return files
+
+    def writeModule(self, name, text):
+        path = os.path.join(self.folder, name)
+        f = open(path, 'wb')
+        f.write(_utf8(text))
+        f.close()
+        return path
+
+
+FORMATS = {'import': ImportExport, 'side': SideExport,
+           'pytest': PytestExport}
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        usage="python tcExport.py <input> <output|-> [options]")
+    parser.add_argument('input')
+    parser.add_argument('output', help="output file, '-' for stdout "
+                        "(pytest: a folder)")
+    parser.add_argument('--format', choices=sorted(FORMATS),
+                        default='import')
+    parser.add_argument('--spool-dir',
+                        help="folder for temporary files (default: TMPDIR)")
+    parser.add_argument('--url', default='https://moztrap.mozilla.org',
+                        help="side, pytest: base URL of MozTrap")
+    parser.add_argument('--split-size', type=float, metavar='MB',
+                        help="side: start a new project past this size")
+    parser.add_argument('--optimize', action='store_true',
+                        help="side: run the Selenese optimizer on each case")
+    parser.add_argument('-q', '--quiet', action='store_const', const=-1,
+                        dest='verbosity', default=0)
+    args = parser.parse_args(argv)
+    tcParser.setupLogging(args.verbosity)
+
+    if args.split_size and args.output == '-':
+        parser.error("--split-size needs an output file")
+    if args.format == 'pytest' and args.output == '-':
+        parser.error("pytest output needs a folder")
+
+    if args.format == 'side':
+        exporter = SideExport(args.input, args.output, url=args.url,
+                              splitSize=int(args.split_size * 1024 * 1024)
+                              if args.split_size else None,
+                              optimize=args.optimize)
+        log.info("EXPORT: %d cases to %s", exporter.count,
+                 ', '.join(exporter.files))
+        return 0
+    if args.format == 'pytest':
+        exporter = PytestExport(args.input, args.output, url=args.url)
+        log.info("EXPORT: %d cases to %d modules in %s", exporter.count,
+                 len(exporter.files) - 1, args.output)
+        return 0
+    exporter = FORMATS[args.format](args.input, spoolFolder=args.spool_dir)
+    if args.output == '-':
+        exporter.write(getattr(sys.stdout, 'buffer', sys.stdout))
+    else:
+        out = open(args.output, 'wb')
+        exporter.write(out)
+        out.close()
+    log.info("EXPORT: %d cases to %s", exporter.count, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,41 +1,172 @@
 # -*- coding: utf-8 -*-
 
-from pywlibs.xhtml import Xhtml
+# Imports are kept to what every run needs; pywlibs, multiprocessing,
+# json and the profilers load on first use (see benchmarks/startup.py).
+import contextlib
+import hashlib
+import heapq
+import logging
 import os
+import re
+import resource
 import sys
+import threading
+import time
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+from io import BytesIO
+
+# settings for pywlib parser
+DOC_TYPE = 'XHTML 1.0 Strict'
+MINIMIZE = False
+
+# renderers: 'slim' (built-in templates) or 'pywlibs' (pywlibs.xhtml)
+RENDERERS = ('slim', 'pywlibs')
+
+# keys of the FileParser inverted index
+INDEX_KINDS = ('product', 'productversion', 'suite', 'tag')
+
+log = logging.getLogger('tcParser')
+log.addHandler(logging.NullHandler())
+
+# per-thread CPU clock where the platform has one (Linux)
+RUSAGE_THREAD = getattr(resource, 'RUSAGE_THREAD',
+                        1 if sys.platform.startswith('linux')
+                        else resource.RUSAGE_SELF)
 
 class XhtmlParser:
 
     caseList = []
 
-    def __init__(self, inputFile, outputFolder=r"./testCases/"):
-        # check if folder exists, otherwise, create one
-        if outputFolder[0] != '/':
-            outputFolder = '/'.join([os.getcwd(), outputFolder])
-        if not os.path.isdir(outputFolder):
-            os.makedirs(outputFolder)
+    def __init__(self, inputFile=None, outputFolder=r"./testCases/",
+                 pipeline=False, renderers=1, processes=False, queueSize=64,
+                 resume=False, caseFilter=None, suitesBy=(), stats=None,
+                 renderer='slim', optimize=False, batch=None, shards=None,
+                 history=None):
+        self.renderer = renderer
+        self.caseList = []
+        self.shardPlan = None
+        self.costs = None
+        self.pipelineStats = None
+        self.journal = None
+        self.outputs = {}
+        self.progress = None
+        self.stats = stats
+        self.optimizer = Optimizer() if optimize else None
+        if inputFile is None:
+            # bare renderer, e.g. inside a worker process
+            return
 
-        if inputFile[0] != '/':
-            inputFile = '/'.join([os.getcwd(), inputFile])
-        fp = FileParser(inputFile)
+        # a folder name, or any sink (MemorySink, StreamSink, ArchiveSink)
+        sink = outputFolder
+        if not hasattr(sink, 'write'):
+            sink = FolderSink(outputFolder)
+        self.sink = sink
 
-        # settings for pywlib parser
-        doc_type = 'XHTML 1.0 Strict'
-        minimize = False
+        if isinstance(inputFile, (str, type(u''))):
+            if inputFile[0] != '/':
+                inputFile = '/'.join([os.getcwd(), inputFile])
+            fp = FileParser(inputFile, caseFilter, stats)
+        else:
+            # spec lines already in memory (a list, a file object)
+            fp = FileParser(caseFilter=caseFilter, lines=inputFile)
 
         # generate basic test suite
-        X = Xhtml(doc_type, minimize)
+        X = xhtmlGenerator(renderer)
+
+        # batch: cases per script (0: all), the suite then links scripts
+        cases = fp.testcases
+        if batch is not None:
+            cases = caseBatches(cases, batch)
+            loads = sum([pageLoads(b.commands()) for b in cases])
+            log.info("BATCH: %d cases in %d scripts, %d page loads "
+                     "(%.2f per case)", len(fp.testcases), len(cases), loads,
+                     float(loads) / max(1, len(fp.testcases)))
+
+        # earlier run times order the suites longest first
+        if history is not None:
+            self.costs = self.caseCosts(cases, history)
+
+        if isinstance(sink, FolderSink):
+            self.journal = Journal(sink.folder, resume)
+        try:
+            jobs = self.caseJobs(cases)
+            self.progress = Progress(len(jobs))
+            if pipeline:
+                self.pipelineGenerator(X, jobs, sink,
+                                       renderers, processes, queueSize)
+            else:
+                self.caseGenerator(X, jobs, sink)
+            start = stats.clock() if stats is not None else None
+            self.suiteGenerator(X, [self.caseList[i] for i in
+                                    self.longestFirst(range(len(cases)))],
+                                sink)
+            for kind in suitesBy:
+                self.indexSuiteGenerator(X, fp.index[kind], kind, sink)
+            if shards:
+                self.shardSuiteGenerator(X, self.costs or
+                                         self.caseCosts(cases), shards, sink)
+            if stats is not None:
+                stats.lap('suite', start)
+            if self.journal is not None:
+                self.journal.complete(len(self.caseList))
+            self.progress.finish()
+            if self.optimizer is not None:
+                log.info(self.optimizer.summary())
+        finally:
+            if self.journal is not None:
+                self.journal.close()
+            sink.close()
+        if stats is not None:
+            stats.finish()
 
-        self.caseGenerator(X, fp.testcases, outputFolder)
-        self.suiteGenerator(X, self.caseList, outputFolder)
+    def caseJobs(self, cases):
+        # name every case, drop the ones a previous run already wrote
+        jobs = []
+        for index, case in enumerate(cases):
+            fn = str(index).zfill(6)
+            self.caseList.append(fn)
+            if self.journal is None:
+                jobs.append((fn, case))
+                continue
+            output = self.outputs[fn] = self.outputDigest(case)
+            if not self.journal.isDone(fn, output):
+                jobs.append((fn, case))
+        if len(jobs) != len(cases):
+            log.info("RESUME: skip %d of %d cases", len(cases) - len(jobs),
+                     len(cases))
+        return jobs
+
+    def suiteGenerator(self, X, cases, sink, name='testSuite',
+                       title="Test Suite"):
+        doc = self.suiteDocument(X, cases, title)
+
+        # drop Test Suite file
+        log.info("DROP: %s", sink.path(name))
+        size, wall = writeDocument(sink, name, doc, self.stats, None,
+                                   atomic=True)
+        if hooks.on_suite_written:
+            hooks.fire('on_suite_written', path=sink.path(name), cases=len(cases),
+                       size=size, wall=wall)
+
+    def suiteDocument(self, X, cases, title="Test Suite"):
+        if isinstance(X, SlimXhtml):
+            return X.suite(cases, title)
+        return self.suiteRender(X, cases, title)
 
-    def suiteGenerator(self, X, cases, outputFolder):
+    def suiteRender(self, X, cases, title):
         # generate header
-        head = self.headGenerator(X, "Test Suite")
+        head = self.headGenerator(X, title)
 
         table = X.table(attrs=(('id', 'suiteTable'), ('cellpadding', '1'), ('cellspacing', '1'), ('border', '1'), ('class', 'selenium')))
         tbodyData = table.tbody()
-        tbodyData.tr().td(X.b("Test Suite"))
+        tbodyData.tr().td(X.b(title))
         for caseLink in cases:
             tbodyData.tr().td(X.a(caseLink, href=caseLink))
 
@@ -43,33 +174,197 @@ class XhtmlParser:
 
         html = X.html(head+body, {'xmlns': 'http://www.w3.org/1999/xhtml', 'xml:lang': 'en', 'lang': 'en'})
 
-        # drop Test Suite file
-        print("DROP: " + '/'.join([outputFolder, 'testSuite']))
-        f = open('/'.join([outputFolder, 'testSuite']), 'w')
-        f.writelines('<?xml version="1.0" encoding="UTF-8"?>')
-        f.writelines(X.doctype())
+        return ''.join(['<?xml version="1.0" encoding="UTF-8"?>',
+                        X.doctype(), html])
 
-        f.writelines(html)
-        f.close()
+    def indexSuiteGenerator(self, X, index, kind, sink):
+        # one suite per tag/suite/product, linking the shared case files
+        for name, links, title in self.indexSuites(index, kind):
+            self.suiteGenerator(X, links, sink, name, title)
+
+    def indexSuites(self, index, kind):
+        used = set()
+        for key in sorted(index):
+            name = 'testSuite-%s-%s' % (kind, re.sub(r'[^A-Za-z0-9._-]+', '_',
+                                                     key) or '_')
+            if name in used:
+                name = '%s-%d' % (name, len(used))
+            used.add(name)
+            yield (name, [self.caseList[i]
+                          for i in self.longestFirst(index[key])],
+                   "Test Suite: %s %s" % (kind, key))
+
+    def longestFirst(self, indices):
+        # case indices, the longest first when earlier runs timed them
+        if self.costs is None:
+            return indices
+        costs = self.costs
+        return sorted(indices, key=lambda i: -costs[i])
 
-    def caseGenerator(self, X, cases, outputFolder):
-        for case in cases:
-            print ("CASE: " + case.__str__())
-            fn = str(cases.index(case)).zfill(6)
+    def caseCosts(self, cases, history=None):
+        # predicted seconds of browser time of each case as rendered;
+        # measured seconds where history has them, the estimates of the
+        # other cases scaled to match
+        if self.optimizer is None:
+            costs = [commandsCost(case.commands()) for case in cases]
+        else:
+            costs = [commandsCost(optimizeCommands(case.commands()))
+                     for case in cases]
+        if history is None:
+            return costs
+        timed = {}
+        for i, case in enumerate(cases):
+            seconds = history.duration(case)
+            if seconds is not None:
+                timed[i] = seconds
+        estimated = sum([costs[i] for i in timed])
+        scale = sum(timed.values()) / estimated if estimated else 1.0
+        log.info("HISTORY: %d of %d cases timed by earlier runs, "
+                 "estimates scaled by %.2f", len(timed), len(cases), scale)
+        return [timed.get(i, cost * scale) for i, cost in enumerate(costs)]
+
+    def shardSuiteGenerator(self, X, costs, shards, sink):
+        # testSuite-shardNN: the cases spread over balanced suites
+        self.shardPlan = shardCases(costs, shards)
+        width = max(2, len(str(shards)))
+        times = []
+        for i, members in enumerate(self.shardPlan):
+            name = 'testSuite-shard%s' % str(i + 1).zfill(width)
+            times.append(sum([costs[c] for c in members]))
+            members = self.longestFirst(members)
+            self.suiteGenerator(X, [self.caseList[c] for c in members], sink,
+                                name, "Test Suite: shard %d of %d" %
+                                (i + 1, shards))
+            log.info("SHARD: %s %d cases, ~%.0fs", name, len(members),
+                     times[-1])
+        log.info("SHARDS: %d shards, longest ~%.0fs, shortest ~%.0fs, "
+                 "~%.0fs in one suite", shards, max(times), min(times),
+                 sum(costs))
+
+    def caseGenerator(self, X, jobs, sink):
+        stats = self.stats
+        for fn, case in jobs:
+            log.debug("CASE: %s", case)
             # drop Test Suite file
-            print("DROP: " + '/'.join([outputFolder, fn]))
-            f = open('/'.join([outputFolder, fn]), 'w')
-            f.writelines('<?xml version="1.0" encoding="UTF-8"?>')
-            f.writelines(X.doctype())
+            log.debug("DROP: %s", sink.path(fn))
+            doc = self.timedRender(X, fn, case)
+            size = writeDocument(sink, fn, doc, stats)[0]
+            if self.journal is not None:
+                self.journal.record(fn, case.digest(), size, self.outputs[fn])
+            if self.progress is not None:
+                self.progress.tick()
 
-            head = self.headGenerator(X, fn)
-            body = self.bodyGenerator(X, fn, case)
+    def pipelineGenerator(self, X, jobs, sink, renderers=1,
+                          processes=False, queueSize=64):
+        # render in the foreground (or in a pool), write in the background
+        stats = self.stats
+        writer = CaseWriter(sink, queueSize, self.journal,
+                            self.progress, stats)
+        writer.start()
+        try:
+            if renderers > 1 and processes:
+                import multiprocessing
+                pool = multiprocessing.Pool(renderers, _initWorker,
+                                            (self.renderer,))
+                try:
+                    # ship the command IR, not the parsed case
+                    docs = pool.imap(_renderCase, ((fn, self.program(fn, case))
+                                                   for fn, case in jobs), 16)
+                    for (fn, case), (fn, doc, wall, cpu) in zip(jobs, docs):
+                        self.caseRendered(fn, case, doc, wall, cpu)
+                        writer.put(fn, doc, case.digest(),
+                                   self.outputs.get(fn))
+                finally:
+                    pool.close()
+                    pool.join()
+            elif renderers > 1:
+                self.threadedRender(X, jobs, writer, renderers)
+            else:
+                for fn, case in jobs:
+                    writer.put(fn, self.timedRender(X, fn, case),
+                               case.digest(), self.outputs.get(fn))
+        finally:
+            writer.finish()
+        self.pipelineStats = writer.stats()
+        log.info("PIPELINE: %s", ', '.join(['%s=%s' % (k, v) for k, v
+                                 in sorted(self.pipelineStats.items())]))
 
-            html = X.html(head+body, {'xmlns': 'http://www.w3.org/1999/xhtml', 'xml:lang': 'en', 'lang': 'en'})
+    def threadedRender(self, X, jobList, writer, renderers):
+        jobs = queue.Queue()
+        for job in jobList:
+            jobs.put(job)
+        errors = []
 
-            f.writelines(html)
-            f.close()
-            self.caseList.append(fn)
+        def work():
+            # pywlibs generators keep per-call state, one per thread
+            XT = xhtmlGenerator(self.renderer)
+            while not errors:
+                try:
+                    fn, case = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    writer.put(fn, self.timedRender(XT, fn, case),
+                               case.digest(), self.outputs.get(fn))
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=work) for i in range(renderers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+    def timedRender(self, X, fn, case):
+        # only look at the clock when somebody is listening
+        if self.stats is None and not hooks.on_case_rendered:
+            return self.caseRender(X, fn, case)
+        wall, cpu = RunStats.clock()
+        doc = self.caseRender(X, fn, case)
+        now, cpuNow = RunStats.clock()
+        self.caseRendered(fn, case, doc, now - wall, cpuNow - cpu)
+        return doc
+
+    def caseRendered(self, fn, case, doc, wall, cpu):
+        if self.stats is not None:
+            self.stats.add('render', wall, cpu, fn)
+        if hooks.on_case_rendered:
+            hooks.fire('on_case_rendered', name=fn, case=case, size=len(doc),
+                       wall=wall, cpu=cpu)
+
+    def caseRender(self, X, fn, case):
+        return self.commandsRender(X, fn, self.program(fn, case))
+
+    def program(self, fn, case):
+        # the commands to render for a case, optimized on request
+        if self.optimizer is None:
+            return case.commands()
+        return self.optimizer.run(fn, case.commands())
+
+    def outputDigest(self, case):
+        # identifies the file a case renders to: its program as optimized
+        # (without counting it in the optimizer report) and the renderer
+        commands = case.commands()
+        if self.optimizer is not None:
+            commands = optimizeCommands(commands)
+        data = '\1'.join([self.renderer] +
+                          ['\0'.join(command) for command in commands])
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return hashlib.md5(data).hexdigest()
+
+    def commandsRender(self, X, fn, commands):
+        if isinstance(X, SlimXhtml):
+            return X.case(fn, commands)
+        head = self.headGenerator(X, fn)
+        body = self.bodyGenerator(X, fn, commands)
+
+        html = X.html(head+body, {'xmlns': 'http://www.w3.org/1999/xhtml', 'xml:lang': 'en', 'lang': 'en'})
+
+        return ''.join(['<?xml version="1.0" encoding="UTF-8"?>',
+                        X.doctype(), html])
 
     def headGenerator(self, X, t):
         meta = X.meta('', {'http-equiv': 'Content-Type', 'content': 'text/html', 'charset': 'UTF-8'})
@@ -78,50 +373,1197 @@ class XhtmlParser:
         head = X.head(meta+link+title, {'profile': 'http://selenium-ide.openqa.org/profiles/test-case'})
         return head
 
-    def bodyGenerator(self, X, fn, case):
+    def bodyGenerator(self, X, fn, commands):
         table = X.table(attrs=(('cellpadding', '1'), ('cellspacing', '1'), ('border', '1')))
 
         table.thead().tr().td(fn, attrs=(('rowspan', '1'), ('colspan', 3)))
         tableData = table.tbody()
+        for action, target, info in commands:
+            self.stepRender(tableData.tr(), action, target, info)
+
+        return X.body(table)
+
+    def stepRender(self, step, action="", target="", info=""):
+        step.td(action)
+        step.td(target)
+        step.td(info)
+
+
+### Selenese Commands
+# A case compiles to a tuple of (command, target, value) triples, the
+# input of every renderer.  Command names and targets are interned, the
+# whole program is hashable and pickles or serializes as plain strings.
+try:
+    intern = sys.intern
+except AttributeError:
+    _intern = intern
+
+    def intern(text):
+        # the Python 2 builtin only takes byte strings
+        return _intern(text) if isinstance(text, str) else text
+
+
+def caseCommands(case):
+    # the (command, target, value) rows that create one case in MozTrap
+    commands = [
         #go to the base page
-        self.stepRender(tableData.tr(), 'open', '/manage/cases/', '')
+        ('open', '/manage/cases/', ''),
         # click add test case
-        self.stepRender(tableData.tr(), 'clickAndWait', 'link=create a test case', '')
+        ('clickAndWait', 'link=create a test case', ''),
         # select product
-        self.stepRender(tableData.tr(), 'select', 'id=id_product', 'label='+case.product)
+        ('select', 'id=id_product', 'label='+case.product),
         # select product version
-        self.stepRender(tableData.tr(), 'select', 'id=id_productversion', 'label='+case.productversion)
+        ('select', 'id=id_productversion', 'label='+case.productversion),
         # select suite
-        self.stepRender(tableData.tr(), 'select', 'id=id_suite', 'label='+case.suite)
+        ('select', 'id=id_suite', 'label='+case.suite),
         # enter title
-        self.stepRender(tableData.tr(), 'sendKeys', 'id=id_name', case.title)
+        ('sendKeys', 'id=id_name', case.title),
         # add description
-        self.stepRender(tableData.tr(), 'sendKeys', 'id=id_description', case.description)
-        # select tags
-        for tag in case.tags:
-            self.stepRender(tableData.tr(), 'sendKeys', 'id=id_add_tags', tag)
-            self.stepRender(tableData.tr(), 'waitForElementPresent', 'link='+tag+' [tag]')
-            self.stepRender(tableData.tr(), 'click', 'link='+tag+' [tag]')
-        # add steps
-        for step in case.steps:
-            index = str(case.steps.index(step))
-            instruction, expected = step
-            self.stepRender(tableData.tr(), 'click', 'id=id_steps-'+index+'-instruction', '')
-            self.stepRender(tableData.tr(), 'sendKeys', 'id=id_steps-'+index+'-instruction', instruction)
-            if expected != "":
-                self.stepRender(tableData.tr(), 'click', 'id=id_steps-'+index+'-expected', '')
-                self.stepRender(tableData.tr(), 'sendKeys', 'id=id_steps-'+index+'-expected', expected)
-        # set as draft
-        self.stepRender(tableData.tr(), 'select', 'id=id_status', 'label=draft')
-        # save
-        self.stepRender(tableData.tr(), 'clickAndWait', 'name=save', '')
+        ('sendKeys', 'id=id_description', case.description)]
+    # select tags
+    for tag in case.tags:
+        link = intern('link='+tag+' [tag]')
+        commands.extend([('sendKeys', 'id=id_add_tags', tag),
+                         ('waitForElementPresent', link, ''),
+                         ('click', link, '')])
+    # add steps
+    for index, (instruction, expected) in enumerate(case.steps):
+        field = stepField(index, 'instruction')
+        commands.extend([('click', field, ''),
+                         ('sendKeys', field, instruction)])
+        if expected != "":
+            field = stepField(index, 'expected')
+            commands.extend([('click', field, ''),
+                             ('sendKeys', field, expected)])
+    # set as draft
+    commands.append(('select', 'id=id_status', 'label=draft'))
+    # save
+    commands.append(('clickAndWait', 'name=save', ''))
+    return tuple(commands)
 
-        return X.body(table)
 
-    def stepRender(self, step, action="", target="", info=""):
-        step.td(action)
-        step.td(target)
-        step.td(info)
+_stepFields = {}
+
+def stepField(index, kind):
+    # 'id=id_steps-<index>-<kind>', shared by every case
+    key = (index, kind)
+    field = _stepFields.get(key)
+    if field is None:
+        field = _stepFields[key] = intern('id=id_steps-%d-%s' % key)
+    return field
+
+
+### Selenese Optimizer
+# rough seconds of browser time per command, for the runtime estimate
+COMMAND_COSTS = {'open': 2.0, 'clickAndWait': 2.0,
+                 'waitForElementPresent': 0.5}
+COMMAND_COST = 0.2  # any other command
+KEYSTROKE_COST = 0.05  # per character entered by sendKeys
+
+# clicking the instruction of a new step adds its row to the form
+NEW_STEP = re.compile(r'id=id_steps-[1-9][0-9]*-instruction$')
+
+
+def optimizeCommands(commands):
+    # the cheaper program samples/addTestCases is written as: type instead
+    # of sendKeys, no click to focus a field before typing into it, tag
+    # suggestions clicked without waiting, nothing for empty texts
+    typed = []
+    for command, target, value in commands:
+        if command == 'sendKeys':
+            if not value:
+                continue
+            command = 'type'
+        typed.append((command, target, value))
+    out = []
+    last = len(typed) - 1
+    for i, (command, target, value) in enumerate(typed):
+        if i < last and typed[i + 1][1] == target:
+            following = typed[i + 1][0]
+            if command == 'click' and following == 'type' and \
+                    not NEW_STEP.match(target):
+                continue
+            if command == 'waitForElementPresent' and following == 'click' \
+                    and target.endswith(' [tag]'):
+                continue
+        out.append((command, target, value))
+    return tuple(out)
+
+
+def commandsCost(commands):
+    seconds = 0.0
+    for command, target, value in commands:
+        seconds += COMMAND_COSTS.get(command, COMMAND_COST)
+        if command == 'sendKeys':
+            seconds += KEYSTROKE_COST * len(value)
+    return seconds
+
+
+class Optimizer:
+    """Runs optimizeCommands over every case and reports what it saved.
+
+    ``cases`` holds ``(name, commands, optimized, seconds, optimized
+    seconds)`` per case, seconds estimated with ``COMMAND_COSTS``.
+    """
+
+    def __init__(self):
+        self.cases = []
+        self.lock = threading.Lock()
+
+    def run(self, fn, commands):
+        optimized = optimizeCommands(commands)
+        before, after = commandsCost(commands), commandsCost(optimized)
+        log.debug("OPTIMIZE: %s %d -> %d commands, ~%.1fs -> ~%.1fs", fn,
+                  len(commands), len(optimized), before, after)
+        with self.lock:
+            self.cases.append((fn, len(commands), len(optimized),
+                               before, after))
+        return optimized
+
+    def report(self):
+        cases = sorted(self.cases)
+        total = [sum(c[i] for c in cases) for i in range(1, 5)]
+        return {'cases': [{'name': fn, 'commands': n, 'optimized': m,
+                           'removed': n - m, 'seconds': round(s, 2),
+                           'optimized_seconds': round(t, 2)}
+                          for fn, n, m, s, t in cases],
+                'commands': total[0], 'optimized': total[1],
+                'removed': total[0] - total[1],
+                'seconds': round(total[2], 2),
+                'optimized_seconds': round(total[3], 2)}
+
+    def summary(self):
+        r = self.report()
+        return ("OPTIMIZE: %d cases, %d -> %d commands (%d removed), "
+                "~%.0fs -> ~%.0fs of browser time" %
+                (len(r['cases']), r['commands'], r['optimized'], r['removed'],
+                 r['seconds'], r['optimized_seconds']))
+
+
+### Batch Scripts
+def pageLoads(commands):
+    # commands that load a page: open and the ...AndWait actions
+    return len([c for c in commands
+                if c[0] == 'open' or c[0].endswith('AndWait')])
+
+
+def caseBatches(cases, size):
+    # consecutive cases, ``size`` per script (all of them for 0)
+    size = size or len(cases) or 1
+    return [CaseBatch(cases[i:i + size]) for i in range(0, len(cases), size)]
+
+
+class CaseBatch:
+    """Cases created one after the other in a single Selenese script.
+
+    Stands in for a TestCase in the generators (``commands``, ``digest``).
+    Saving a case returns to the case list, so every case after the first
+    starts at its "create a test case" link instead of opening the list:
+    two page loads per case instead of three, and one browser session.
+    """
+
+    ir = None
+
+    def __init__(self, cases):
+        self.cases = cases
+        self.title = "%d cases" % len(cases)
+
+    def commands(self):
+        if self.ir is None:
+            commands = []
+            for case in self.cases:
+                program = case.commands()
+                if commands and program[0][0] == 'open':
+                    program = program[1:]
+                commands.extend(program)
+            self.ir = tuple(commands)
+        return self.ir
+
+    def digest(self):
+        data = ' '.join([case.digest() for case in self.cases])
+        return hashlib.md5(data.encode('ascii')).hexdigest()
+
+    def __str__(self):
+        return "Batch: " + ', '.join([case.title for case in self.cases])
+
+
+### Suite Shards
+def shardCases(costs, shards):
+    """Spreads cases over ``shards`` suites of about equal cost.
+
+    Longest processing time first: the most expensive remaining case goes
+    to the shard with the least predicted time so far, which keeps the
+    longest shard within 4/3 of the best possible.  Returns the case
+    indices of each shard in spec order.
+    """
+    loads = [(0.0, i) for i in range(max(1, shards))]
+    members = [[] for load in loads]
+    for index in sorted(range(len(costs)), key=lambda i: -costs[i]):
+        load, shard = heapq.heappop(loads)
+        members[shard].append(index)
+        heapq.heappush(loads, (load + costs[index], shard))
+    return [sorted(m) for m in members]
+
+
+### Run History
+class RunHistory:
+    """Case durations and outcomes recorded by earlier Selenium runs.
+
+    Reads, by content:
+
+    * CSV: ``case,seconds[,status]`` rows (a header row is skipped)
+    * JSON: ``{case: seconds}`` or
+      ``[{"case": ..., "seconds": ..., "status": ...}]``
+    * JUnit XML (selenium-side-runner, ``pytest --junitxml``):
+      ``<testcase name=... time=...>``, failed with a failure or error
+    * Selenese HTML suite results: the suite rows naming the case files,
+      ``status_passed``/``status_failed``, with a seconds cell where the
+      log has one
+
+    A case is named by its digest, its title or its case file name
+    (``000042``, also as ``test_create_case[000042]`` or
+    ``<title> [000042]``).  File names are only positions, so they are
+    resolved through the output folder's journal to the digest of the
+    case each file holds now (its last line for the file); a case seen
+    several times gets its mean duration and its last outcome.
+    """
+
+    FAILED = ('fail', 'failed', 'failure', 'error')
+
+    def __init__(self, paths=(), journalFolder=None):
+        self.times = {}
+        self.outcomes = {}
+        for path in paths:
+            self.load(path)
+        if journalFolder is not None:
+            for fn, digest in Journal.files(journalFolder).items():
+                if fn in self.times:
+                    self.times.setdefault(digest, []).extend(
+                        self.times.pop(fn))
+                if fn in self.outcomes:
+                    self.outcomes[digest] = self.outcomes.pop(fn)
+        self.seconds = dict((key, sum(values) / len(values))
+                            for key, values in self.times.items())
+
+    def __len__(self):
+        return len(self.seconds)
+
+    def duration(self, case):
+        seconds = self.seconds.get(case.digest())
+        if seconds is None:
+            seconds = self.seconds.get(case.title)
+        return seconds
+
+    def failed(self):
+        # digests, titles or unresolved file names of the failed cases
+        return sorted([key for key, status in self.outcomes.items()
+                       if status in self.FAILED])
+
+    def add(self, name, seconds=None, status=None):
+        name = name.strip()
+        # only a bare number or a bracketed one names a case file; a title
+        # may well start with a number
+        match = re.match(r'(?:.*\[(\d{6,})\]|(\d{6,}))$', name, re.DOTALL)
+        if match:
+            name = match.group(1) or match.group(2)
+        if seconds is not None:
+            self.times.setdefault(name, []).append(float(seconds))
+        if status:
+            self.outcomes[name] = status.strip().lower()
+
+    def load(self, path):
+        f = open(path, 'rb')
+        text = f.read().decode('utf-8')
+        f.close()
+        head = text.lstrip()[:1]
+        if head in ('{', '['):
+            self.loadJson(text)
+        elif head == '<' and '<testcase' in text:
+            self.loadJunit(text)
+        elif head == '<':
+            self.loadHtml(text)
+        else:
+            self.loadCsv(text)
+
+    def loadCsv(self, text):
+        import csv
+        for row in csv.reader(text.splitlines()):
+            if len(row) < 2:
+                continue
+            seconds = row[1] if re.match(r'\s*[0-9.]+\s*$', row[1]) else None
+            status = row[2] if len(row) > 2 else None
+            if seconds is not None or (status and row[2] != 'status'):
+                self.add(row[0], seconds, status)
+
+    def loadJson(self, text):
+        import json
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = [{'case': k, 'seconds': v} for k, v in data.items()]
+        for entry in data:
+            self.add(entry['case'], entry.get('seconds'), entry.get('status'))
+
+    def loadJunit(self, text):
+        from xml.etree import ElementTree
+        root = ElementTree.fromstring(text.encode('utf-8'))
+        for testcase in root.iter('testcase'):
+            if testcase.find('skipped') is not None:
+                status = None
+            elif testcase.find('failure') is not None or \
+                    testcase.find('error') is not None:
+                status = 'failed'
+            else:
+                status = 'passed'
+            self.add(testcase.get('name', ''), testcase.get('time') or None,
+                     status)
+
+    def loadHtml(self, text):
+        for attrs, row in re.findall(r'<tr([^>]*)>(.*?)</tr>', text,
+                                     re.I | re.S):
+            link = re.search(r'<a[^>]*>(.*?)</a>', row, re.I | re.S)
+            if not link:
+                continue
+            cells = [re.sub(r'<[^>]*>', '', cell).strip() for cell in
+                     re.findall(r'<td[^>]*>(.*?)</td>', row, re.I | re.S)]
+            seconds = [c for c in cells if re.match(r'[0-9.]+ ?s$', c)]
+            status = re.search(r'status_(\w+)', attrs)
+            self.add(link.group(1),
+                     seconds[0].rstrip(' s') if seconds else None,
+                     status.group(1) if status else None)
+
+
+def rerunFailed(inputFile, outputFolder, results, caseFilter=None,
+                renderer='slim'):
+    """Writes ``testSuite-failed`` into an output folder: the case files
+    of the cases the results record as failed, as they already are.
+
+    Failures are mapped to case files through the folder's journal; the
+    spec is only parsed when results name cases by title.  Nothing is
+    rendered.  Returns the linked case files.
+    """
+    history = RunHistory(results, outputFolder)
+    failed = history.failed()
+    files = Journal.files(outputFolder)
+    digests = set(files.values())
+    wanted = set([key for key in failed if key in digests])
+    rest = [key for key in failed if key not in digests]
+    # file names no journal knows, taken as they are
+    loose = set([key for key in rest if re.match(r'\d{6,}$', key) and
+                 os.path.isfile('/'.join([outputFolder, key]))])
+    titles = set([key for key in rest if key not in loose])
+    if titles:
+        for case in FileParser(inputFile, caseFilter).testcases:
+            if case.title in titles and case.digest() in digests:
+                wanted.add(case.digest())
+                titles.discard(case.title)
+    if titles:
+        log.warning("RERUN: %d failed cases match no case file in %s",
+                    len(titles), outputFolder)
+    links = sorted([fn for fn, digest in files.items() if digest in wanted]
+                   + list(loose))
+    sink = FolderSink(outputFolder)
+    try:
+        XhtmlParser(renderer=renderer).suiteGenerator(
+            xhtmlGenerator(renderer), links, sink, 'testSuite-failed',
+            "Test Suite: failed")
+    finally:
+        sink.close()
+    log.info("RERUN: %d failed cases in testSuite-failed, nothing rendered",
+             len(links))
+    return links
+
+
+### Slim Selenese Output
+class SlimXhtml:
+    """Renders the few elements tcParser emits straight from templates.
+
+    Produces the same bytes as the pywlibs generator for case and suite
+    documents (contents unescaped, attributes escaped, the same line
+    breaks), without importing pywlibs or building an element tree.
+    """
+
+    PROLOG = ('<?xml version="1.0" encoding="UTF-8"?>'
+              '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" '
+              '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">'
+              '<html lang="en" xmlns="http://www.w3.org/1999/xhtml" '
+              'xml:lang="en">\n'
+              '<head profile="http://selenium-ide.openqa.org/profiles/test-case">\n'
+              '<meta content="" name="{\'content\': \'text/html\', '
+              '\'charset\': \'UTF-8\', \'http-equiv\': \'Content-Type\'}" />'
+              '<link rel="" href="{\'href\': \'https//moztrap.mozilla.org/\', '
+              '\'rel\': \'selenium.base\'}" />')
+
+    def doctype(self):
+        return ('<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Strict//EN" '
+                '"http://www.w3.org/TR/xhtml1/DTD/xhtml1-strict.dtd">')
+
+    def head(self, title):
+        return ''.join([self.PROLOG, '<title>', title, '</title>\n</head>'])
+
+    def case(self, fn, commands):
+        out = [self.head(fn),
+               '<body>\n<table cellpadding="1" cellspacing="1" border="1">\n'
+               '<thead>\n<tr>\n<td rowspan="1" colspan="3">', fn,
+               '</td>\n</tr>\n</thead>\n<tbody>']
+        for action, target, info in commands:
+            out.extend(['\n<tr>\n<td>', action, '</td>\n<td>', target,
+                        '</td>\n<td>', info, '</td>\n</tr>'])
+        out.append('\n</tbody>\n</table>\n</body>\n</html>')
+        return ''.join(out)
+
+    def suite(self, cases, title):
+        out = [self.head(title),
+               '<body>\n<table id="suiteTable" cellpadding="1" cellspacing="1" '
+               'border="1" class="selenium">\n<tbody>\n<tr>\n<td><b>', title,
+               '</b></td>\n</tr>']
+        for caseLink in cases:
+            out.extend(['\n<tr>\n<td><a href="', self.attr(caseLink), '">',
+                        caseLink, '</a></td>\n</tr>'])
+        out.append('\n</tbody>\n</table>\n</body>\n</html>')
+        return ''.join(out)
+
+    def attr(self, value):
+        return value.replace('&', '&amp;').replace('<', '&lt;') \
+                    .replace('>', '&gt;').replace('"', '&quot;') \
+                    .replace('\n', '&#10;').replace('\r', '&#13;') \
+                    .replace('\t', '&#9;')
+
+
+def xhtmlGenerator(renderer='slim'):
+    if renderer == 'pywlibs':
+        from pywlibs.xhtml import Xhtml
+        return Xhtml(DOC_TYPE, MINIMIZE)
+    return SlimXhtml()
+
+
+### Render worker for process pools
+_worker = None
+
+def _initWorker(renderer):
+    global _worker
+    _worker = (XhtmlParser(), xhtmlGenerator(renderer))
+
+def _renderCase(job):
+    global _worker
+    if _worker is None:
+        _initWorker('slim')
+    fn, commands = job
+    wall, cpu = RunStats.clock()
+    doc = _worker[0].commandsRender(_worker[1], fn, commands)
+    now, cpuNow = RunStats.clock()
+    return fn, doc, now - wall, cpuNow - cpu
+
+
+### Document Output
+def writeDocument(sink, name, doc, stats=None, phase='write', atomic=False):
+    # write one rendered file; returns the bytes written and the wall time
+    # (None unless anyone measures it)
+    if stats is None and not hooks.on_file_written and \
+            not hooks.on_suite_written:
+        return sink.write(name, doc, atomic), None
+    wall, cpu = RunStats.clock()
+    size = sink.write(name, doc, atomic)
+    now, cpuNow = RunStats.clock()
+    if stats is not None:
+        if phase is not None:
+            stats.add(phase, now - wall, cpuNow - cpu)
+        stats.wrote(size)
+    if hooks.on_file_written:
+        hooks.fire('on_file_written', path=sink.path(name), size=size,
+                   wall=now - wall, cpu=cpuNow - cpu)
+    return size, now - wall
+
+
+def _bytes(doc):
+    return doc if isinstance(doc, bytes) else doc.encode('utf-8')
+
+
+### Output Sinks
+# Everything the generators write goes through a sink: write(name, doc,
+# atomic) returning the bytes written, path(name) for messages and hooks,
+# and close() at the end.
+class FolderSink:
+    """Writes every document to a file of its own in ``folder``."""
+
+    def __init__(self, folder):
+        if folder[0] != '/':
+            folder = '/'.join([os.getcwd(), folder])
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        self.folder = folder
+
+    def path(self, name):
+        return '/'.join([self.folder, name])
+
+    def write(self, name, doc, atomic=False):
+        # atomic: readers see either the old or the new file, never a part
+        path = self.path(name)
+        target = path + '.tmp' if atomic else path
+        data = _bytes(doc)
+        f = open(target, 'wb')
+        f.write(data)
+        f.close()
+        if atomic:
+            os.rename(target, path)
+        return len(data)
+
+    def remove(self, name):
+        path = self.path(name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def close(self):
+        pass
+
+
+class MemorySink:
+    """Keeps the documents as UTF-8 bytes in ``files``, names in ``order``."""
+
+    def __init__(self):
+        self.files = {}
+        self.order = []
+
+    def path(self, name):
+        return name
+
+    def write(self, name, doc, atomic=False):
+        if name not in self.files:
+            self.order.append(name)
+        self.files[name] = _bytes(doc)
+        return len(self.files[name])
+
+    def close(self):
+        pass
+
+
+class StreamSink:
+    """Frames the documents onto a binary stream, e.g. a pipe or socket.
+
+    Each document is a ``<name>\t<byte length>\n`` line and its bytes.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def path(self, name):
+        return name
+
+    def write(self, name, doc, atomic=False):
+        data = _bytes(doc)
+        self.stream.write(('%s\t%d\n' % (name, len(data))).encode('ascii'))
+        self.stream.write(data)
+        return len(data)
+
+    def close(self):
+        self.stream.flush()
+
+
+class ArchiveSink:
+    """Packs the documents into a zip, tar or tar.gz archive.
+
+    ``target`` is a file name (the format follows its extension) or a
+    binary file object, which is left open.
+    """
+
+    FORMATS = (('.zip', 'zip'), ('.tar', 'tar'), ('.tar.gz', 'tar.gz'),
+               ('.tgz', 'tar.gz'))
+
+    def __init__(self, target, fmt=None):
+        self.fmt = fmt or self.format(target)
+        self.name = target if self.format(target) else '<archive>'
+        if self.fmt == 'zip':
+            import zipfile
+            self.archive = zipfile.ZipFile(target, 'w', zipfile.ZIP_DEFLATED)
+        else:
+            import tarfile
+            mode = 'w:gz' if self.fmt == 'tar.gz' else 'w'
+            if hasattr(target, 'write'):
+                self.archive = tarfile.open(fileobj=target, mode=mode)
+            else:
+                self.archive = tarfile.open(target, mode)
+        self.now = time.time()
+
+    @classmethod
+    def format(cls, target):
+        # archive format implied by a file name, None for anything else
+        if not isinstance(target, str):
+            return None
+        for ext, fmt in cls.FORMATS:
+            if target.endswith(ext):
+                return fmt
+        return None
+
+    def path(self, name):
+        return '%s:%s' % (self.name, name)
+
+    def write(self, name, doc, atomic=False):
+        data = _bytes(doc)
+        if self.fmt == 'zip':
+            self.archive.writestr(name, data)
+            return len(data)
+        import tarfile
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self.now
+        self.archive.addfile(info, BytesIO(data))
+        return len(data)
+
+    def close(self):
+        self.archive.close()
+
+
+### Background Case Writer
+class CaseWriter(threading.Thread):
+    """Drains rendered documents from a bounded queue into a sink."""
+
+    def __init__(self, sink, queueSize=64, journal=None,
+                 progress=None, stats=None):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.sink = sink
+        self.journal = journal
+        self.progress = progress
+        self.runStats = stats
+        self.queue = queue.Queue(max(1, queueSize))
+        self.error = None
+        self.written = 0
+        self.bytesWritten = 0
+        self.maxDepth = 0
+        self.depthTotal = 0
+        self.puts = 0
+        self.stalls = 0
+        self.stallTime = 0.0
+        self.idleTime = 0.0
+        self.lock = threading.Lock()
+
+    def put(self, fn, doc, digest=None, output=None):
+        if self.error is not None:
+            raise self.error
+        try:
+            self.queue.put_nowait((fn, doc, digest, output))
+        except queue.Full:
+            # the renderer outran the disk, wait for room
+            start = time.time()
+            self.queue.put((fn, doc, digest, output))
+            with self.lock:
+                self.stalls += 1
+                self.stallTime += time.time() - start
+        depth = self.queue.qsize()
+        with self.lock:
+            self.puts += 1
+            self.depthTotal += depth
+            if depth > self.maxDepth:
+                self.maxDepth = depth
+
+    def finish(self):
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        while True:
+            start = time.time()
+            item = self.queue.get()
+            self.idleTime += time.time() - start
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # keep draining so the producer never blocks
+            fn, doc, digest, output = item
+            try:
+                log.debug("DROP: %s", self.sink.path(fn))
+                size = writeDocument(self.sink, fn, doc, self.runStats)[0]
+                if self.journal is not None:
+                    self.journal.record(fn, digest, size, output)
+                self.written += 1
+                self.bytesWritten += size
+                if self.progress is not None:
+                    self.progress.tick()
+            except Exception as e:
+                self.error = e
+
+    def stats(self):
+        return {'written': self.written,
+                'bytes': self.bytesWritten,
+                'queue_max_depth': self.maxDepth,
+                'queue_avg_depth': round(float(self.depthTotal) / self.puts, 2)
+                                   if self.puts else 0.0,
+                'producer_stalls': self.stalls,
+                'producer_stall_s': round(self.stallTime, 4),
+                'writer_idle_s': round(self.idleTime, 4)}
+
+
+### Event Hooks
+class Hooks:
+    """Registry of callbacks fired while specs are parsed and rendered.
+
+    Callbacks receive keyword arguments only:
+
+    - ``on_file_opened``: path, size
+    - ``on_case_parsed``: case, line, wall
+    - ``on_case_rendered``: name, case, size, wall, cpu
+    - ``on_file_written``: path, size, wall, cpu
+    - ``on_suite_written``: path, cases, size, wall
+
+    Every event is a plain list attribute, so call sites test
+    ``if hooks.<event>:`` and pay nothing while no callback is registered.
+    Render and write events may fire from pipeline threads.
+    """
+
+    EVENTS = ('on_file_opened', 'on_case_parsed', 'on_case_rendered',
+              'on_file_written', 'on_suite_written')
+
+    def __init__(self):
+        for event in self.EVENTS:
+            setattr(self, event, [])
+
+    def register(self, event, callback):
+        if event not in self.EVENTS:
+            raise ValueError("unknown event: %s" % event)
+        getattr(self, event).append(callback)
+        return callback
+
+    def unregister(self, event, callback):
+        getattr(self, event).remove(callback)
+
+    def clear(self):
+        for event in self.EVENTS:
+            del getattr(self, event)[:]
+
+    def fire(self, event, **payload):
+        for callback in getattr(self, event):
+            callback(**payload)
+
+hooks = Hooks()
+
+
+### Run Statistics
+class RunStats:
+    """Wall and CPU time per phase, throughput and the slowest renders.
+
+    Phases are ``read``, ``parse``, ``render``, ``write`` and ``suite``.
+    CPU time is taken from the calling thread, so in pipelined runs the
+    render and write phases overlap in wall time and may add up to more
+    than the total.
+    """
+
+    PHASES = ('read', 'parse', 'render', 'write', 'suite')
+
+    def __init__(self, slowest=10):
+        self.slowest = slowest
+        self.phases = dict((name, [0.0, 0.0, 0]) for name in self.PHASES)
+        self.slow = []
+        self.cases = 0
+        self.bytesWritten = 0
+        self.lock = threading.Lock()
+        self.start = self.clock()
+        self.end = None
+
+    @staticmethod
+    def clock():
+        r = resource.getrusage(RUSAGE_THREAD)
+        return time.time(), r.ru_utime + r.ru_stime
+
+    def add(self, name, wall, cpu, fn=None):
+        with self.lock:
+            phase = self.phases[name]
+            phase[0] += wall
+            phase[1] += cpu
+            phase[2] += 1
+            if fn is not None:
+                self.cases += 1
+                if len(self.slow) < self.slowest:
+                    heapq.heappush(self.slow, (wall, fn))
+                elif wall > self.slow[0][0]:
+                    heapq.heapreplace(self.slow, (wall, fn))
+
+    def lap(self, name, start, fn=None):
+        now = self.clock()
+        self.add(name, now[0] - start[0], now[1] - start[1], fn)
+        return now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = self.clock()
+        yield
+        self.lap(name, start)
+
+    def wrote(self, size):
+        with self.lock:
+            self.bytesWritten += size
+
+    def finish(self):
+        self.end = self.clock()
+
+    def report(self):
+        end = self.end or self.clock()
+        wall = end[0] - self.start[0]
+        return {
+            'wall_s': round(wall, 4),
+            'cpu_s': round(end[1] - self.start[1], 4),
+            'cases': self.cases,
+            'cases_per_s': round(self.cases / wall, 2) if wall > 0 else 0.0,
+            'bytes_written': self.bytesWritten,
+            'phases': dict((name, {'wall_s': round(w, 4), 'cpu_s': round(c, 4),
+                                   'count': n})
+                           for name, (w, c, n) in self.phases.items()),
+            'slowest_renders': [{'file': fn, 'wall_s': round(w, 6)}
+                                for w, fn in sorted(self.slow, reverse=True)],
+        }
+
+    def summary(self):
+        r = self.report()
+        out = ["STATS: %d cases in %.3fs (%.1f cases/s), %d bytes written" %
+               (r['cases'], r['wall_s'], r['cases_per_s'], r['bytes_written'])]
+        for name in self.PHASES:
+            p = r['phases'][name]
+            out.append("STATS: %-6s wall %8.3fs  cpu %8.3fs  x%d" %
+                       (name, p['wall_s'], p['cpu_s'], p['count']))
+        for s in r['slowest_renders']:
+            out.append("STATS: slow render %s %.6fs" % (s['file'], s['wall_s']))
+        return '\n'.join(out)
+
+
+### Progress Reporting
+class Progress:
+    """Logs a periodic progress line (rate, ETA) instead of per-case output."""
+
+    interval = 5.0
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.start = self.last = time.time()
+
+    def tick(self):
+        self.done += 1
+        # only look at the clock every few cases
+        if self.done & 63 == 0:
+            now = time.time()
+            if now - self.last >= self.interval:
+                self.last = now
+                self.report(now)
+
+    def report(self, now):
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else 0.0
+        log.info("PROGRESS: %d/%d cases (%.0f%%), %.1f cases/s, ETA %.0fs",
+                 self.done, self.total,
+                 100.0 * self.done / self.total if self.total else 100.0,
+                 rate, eta)
+
+    def finish(self):
+        self.report(time.time())
+
+
+### Buffered Log Output
+class BufferedHandler(logging.Handler):
+    """Collects formatted records and writes them out in batches.
+
+    The stream is written at most once per ``interval`` seconds, and right
+    away for warnings and errors, so per-record flushing never dominates.
+    """
+
+    def __init__(self, stream=None, interval=1.0):
+        logging.Handler.__init__(self)
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.buffer = []
+        self.last = time.time()
+
+    def emit(self, record):
+        try:
+            self.buffer.append(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+        if record.levelno >= logging.WARNING or \
+                time.time() - self.last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self.buffer:
+                self.stream.write(''.join(self.buffer))
+                self.buffer = []
+                self.stream.flush()
+            self.last = time.time()
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        logging.Handler.close(self)
+
+
+def setupLogging(verbosity=0, progressInterval=None):
+    # -1: warnings only, 0: progress and summaries, 1: every case
+    level = {-1: logging.WARNING, 0: logging.INFO}.get(verbosity, logging.DEBUG)
+    handler = BufferedHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(handler)
+    log.setLevel(level)
+    if progressInterval is not None:
+        Progress.interval = progressInterval
+
+
+### Generation Journal
+class Journal:
+    """Append-only record of the case files a run has completely written.
+
+    Each line is ``<file>\t<case digest>\t<size>\t<output digest>``, the
+    output digest naming the program and renderer the file was written
+    with (``XhtmlParser.outputDigest``); a final ``SUITE`` line marks a
+    finished run.  With ``resume`` the existing journal is
+    validated against the output folder and extended instead of replaced.
+    """
+
+    name = '.journal'
+
+    def __init__(self, outputFolder, resume=False):
+        self.outputFolder = outputFolder
+        self.path = '/'.join([outputFolder, self.name])
+        self.done = {}
+        if resume and os.path.isfile(self.path):
+            self.done = self.load()
+        self.lock = threading.Lock()
+        self.f = open(self.path, 'a' if resume else 'w')
+
+    @classmethod
+    def files(cls, outputFolder):
+        # {file: case digest} of the case files as they are now: --resume
+        # and --watch append another line for every file they write again
+        path = '/'.join([outputFolder, cls.name])
+        if not os.path.isfile(path):
+            return {}
+        files = {}
+        f = open(path, 'r')
+        for line in f:
+            if line.endswith('\n') and line.count('\t') == 3:
+                fn, digest = line.split('\t')[:2]
+                files[fn] = digest
+        f.close()
+        return dict((fn, digest) for fn, digest in files.items()
+                    if os.path.isfile('/'.join([outputFolder, fn])))
+
+    def load(self):
+        done = {}
+        f = open(self.path, 'r')
+        for line in f:
+            if not line.endswith('\n'):
+                break  # torn write from the interrupted run
+            fields = line[:-1].split('\t')
+            if len(fields) != 4:
+                continue
+            fn, digest, size, output = fields
+            path = '/'.join([self.outputFolder, fn])
+            # only trust files that are still there, whole
+            if size.isdigit() and os.path.isfile(path) and \
+                    os.path.getsize(path) == int(size):
+                done[fn] = output
+            else:
+                done.pop(fn, None)
+        f.close()
+        return done
+
+    def isDone(self, fn, output):
+        return self.done.get(fn) == output
+
+    def record(self, fn, digest, size, output):
+        with self.lock:
+            self.f.write('%s\t%s\t%d\t%s\n' % (fn, digest, size, output))
+            self.f.flush()
+            self.done[fn] = output
+
+    def complete(self, count):
+        with self.lock:
+            self.f.write('SUITE\t%d\n' % count)
+            self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+### Watch Mode
+class Inotify:
+    """Waits for writes to one file through inotify(7), loaded via ctypes.
+
+    The directory is watched rather than the file, so editors that save
+    by writing a new file and renaming it over the old one are seen too.
+    """
+
+    MASK = 0x8 | 0x80  # IN_CLOSE_WRITE | IN_MOVED_TO
+
+    def __init__(self, path):
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        encode = getattr(os, 'fsencode', lambda p: p)
+        self.name = encode(os.path.basename(path))
+        self.fd = libc.inotify_init1(os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        folder = encode(os.path.dirname(os.path.abspath(path)))
+        if libc.inotify_add_watch(self.fd, folder, self.MASK) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch")
+
+    def wait(self, timeout):
+        # True when the file changed, False on timeout
+        import select
+        import struct
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        data = os.read(self.fd, 65536)
+        changed = False
+        offset = 0
+        while offset < len(data):
+            length = struct.unpack_from('iIII', data, offset)[3]
+            name = data[offset + 16:offset + 16 + length].rstrip(b'\0')
+            changed = changed or name == self.name
+            offset += 16 + length
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Poller:
+    """Stat polling fallback where inotify is not available."""
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return None  # unknown, compare the file signature
+
+    def close(self):
+        pass
+
+
+class Watcher:
+    """Regenerates an output folder whenever its spec file changes.
+
+    The spec is cut into cases at ``DONE`` lines and only cases whose text
+    (or inherited product/suite/tags) changed are parsed again.  Their
+    output digests are checked against the journal, so only changed cases are
+    rendered, and only suites whose links changed are rewritten, atomically.
+    Case and index suite files that no longer exist are removed.
+    """
+
+    def __init__(self, inputFile, outputFolder, caseFilter=None,
+                 suitesBy=(), renderer='slim', interval=0.5, optimize=False):
+        self.inputFile = inputFile
+        self.sink = FolderSink(outputFolder)
+        self.caseFilter = caseFilter
+        self.suitesBy = suitesBy
+        self.interval = interval
+        self.parser = XhtmlParser(renderer=renderer, optimize=optimize)
+        self.X = xhtmlGenerator(renderer)
+        self.journal = Journal(self.sink.folder, resume=True)
+        self.parser.journal = self.journal
+        self.chunks = {}
+        self.suites = dict((name, None) for name
+                           in os.listdir(self.sink.folder)
+                           if name.startswith('testSuite-'))
+
+    def signature(self):
+        try:
+            st = os.stat(self.inputFile)
+        except OSError:
+            return None  # between unlink and rename of a saving editor
+        return (st.st_ino, st.st_size, st.st_mtime)
+
+    def parse(self):
+        # [(case, output digest)] and an index, reusing the cases parsed
+        # last time
+        f = open(self.inputFile, 'r')
+        pieces = f.read().split('\nDONE\n')
+        f.close()
+        fp = FileParser(lines=[], caseFilter=self.caseFilter)
+        chunks = {}
+        cases = []
+        context = None
+        last = len(pieces) - 1
+        for i, piece in enumerate(pieces):
+            if i < last:
+                piece += '\nDONE\n'
+            elif not piece:
+                break
+            key = (context, piece)
+            parsed = self.chunks.get(key)
+            if parsed is None:
+                chunk = FileParser(lines=piece.splitlines(True),
+                                   caseFilter=self.caseFilter,
+                                   context=context)
+                parsed = ([(case, self.parser.outputDigest(case))
+                           for case in chunk.testcases], chunk.context)
+            chunks[key] = parsed
+            for case, digest in parsed[0]:
+                fp.caseParsed(case)
+                cases.append((case, digest))
+            context = parsed[1]
+        self.chunks = chunks
+        return cases, fp.index
+
+    def update(self):
+        start = time.time()
+        cases, index = self.parse()
+        parser = self.parser
+        parser.caseList = []
+        parser.outputs = {}
+        jobs = []
+        for i, (case, output) in enumerate(cases):
+            fn = str(i).zfill(6)
+            parser.caseList.append(fn)
+            parser.outputs[fn] = output
+            if not self.journal.isDone(fn, output):
+                jobs.append((fn, case))
+        parser.caseGenerator(self.X, jobs, self.sink)
+
+        suites = {'testSuite': (parser.caseList, "Test Suite")}
+        for kind in self.suitesBy:
+            for name, links, title in parser.indexSuites(index[kind], kind):
+                suites[name] = (links, title)
+        for name in sorted(suites):
+            if suites[name] != self.suites.get(name):
+                links, title = suites[name]
+                parser.suiteGenerator(self.X, links, self.sink, name, title)
+        stale = sorted(set(self.journal.done) - set(parser.caseList)) + \
+                sorted(set(self.suites) - set(suites))
+        for name in stale:
+            self.sink.remove(name)
+            self.journal.done.pop(name, None)
+        self.suites = suites
+        self.journal.complete(len(parser.caseList))
+        log.info("UPDATE: %d of %d cases rendered, %d files removed "
+                 "in %.1f ms", len(jobs), len(parser.caseList), len(stale),
+                 (time.time() - start) * 1000)
+
+    def watch(self):
+        try:
+            waiter = Inotify(self.inputFile)
+        except (AttributeError, OSError):
+            waiter = Poller()
+        log.info("WATCH: %s (%s)", self.inputFile,
+                 waiter.__class__.__name__.lower())
+        signature = self.signature()
+        try:
+            self.update()
+            while True:
+                for handler in log.handlers:
+                    handler.flush()
+                changed = waiter.wait(self.interval)
+                now = self.signature()
+                if now is None:
+                    continue
+                if changed or (changed is None and now != signature):
+                    signature = now
+                    self.update()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            waiter.close()
+            self.journal.close()
 
 
 ### File Parser
@@ -129,26 +1571,54 @@ class FileParser:
 
     testcases = []
 
-    def __init__(self, filename):
+    def __init__(self, filename=None, caseFilter=None, stats=None, lines=None,
+                 context=None):
         self.testcases = []
-        print("OPEN: " + filename) ### log
+        self.caseFilter = caseFilter
+        # inverted index: kind -> value -> ids (positions in testcases)
+        self.index = dict((kind, {}) for kind in INDEX_KINDS)
+        # (line, title) of EXPECTED blocks without text / cases without DONE
+        self.emptyExpected = []
+        self.unterminated = []
+        if lines is not None:
+            # spec text already in memory
+            self.parsing(lines, context)
+            return
+        log.info("OPEN: %s", filename)
         f = open(filename, 'r')
-        self.parsing(f.readlines())
+        if hooks.on_file_opened:
+            hooks.fire('on_file_opened', path=filename,
+                       size=os.path.getsize(filename))
+        if stats is not None:
+            # read up front so reading and parsing are timed apart
+            with stats.phase('read'):
+                lines = f.readlines()
+            with stats.phase('parse'):
+                self.parsing(lines)
+        else:
+            self.parsing(f)
         f.close()
 
-    def parsing(self, lines):
-        product = ""
-        productversion = ""
-        suite = ""
+    def parsing(self, lines, context=None):
+        # context: (product, productversion, suite, tags) carried over from
+        # the cases before ``lines``; the one after them ends up in .context
+        caseFilter = self.caseFilter
+        skip = False
+        opened = 0
+        expectLine = 0
+        caseStart = time.time()
+        product, productversion, suite, tags = context or ("", "", "", ())
+        tags = list(tags)
         title = ""
         description = []
-        tags = []
         steps = []
         step = []
         expect =[]
 
         state = ""
+        lineno = 0
         for line in lines:
+            lineno += 1
             for case in switch(line):
                 if case("PRODUCT\n"):
                     state = "PRODUCT"
@@ -160,7 +1630,15 @@ class FileParser:
                     state = "SUITE"
                     break
                 if case("TITLE\n"):
+                    if opened:
+                        self.unterminated.append((opened, title))
+                    opened = lineno
+                    if hooks.on_case_parsed:
+                        caseStart = time.time()
                     state = "TITLE"
+                    if caseFilter is not None:
+                        skip = not caseFilter.matchHeader(product,
+                                                          productversion, suite)
                     break
                 if case("DESCRIPTION\n"):
                     state = "DESCRIPTION"
@@ -171,6 +1649,17 @@ class FileParser:
                     tags = []
                     break
                 if case("STEP\n"):
+                    if skip:
+                        state = "SKIP"
+                        break
+                    if caseFilter is not None and not steps and not step \
+                            and not caseFilter.matchTags(tags):
+                        # tags are known once the first step starts
+                        skip = True
+                        state = "SKIP"
+                        break
+                    if state == "EXPECTED" and not ''.join(expect).strip():
+                        self.emptyExpected.append((expectLine, title))
                     if len(step) != 0:
                         steps.append((''.join(step), ''.join(expect)))
                     state = "STEP"
@@ -178,16 +1667,34 @@ class FileParser:
                     expect = []
                     break
                 if case("EXPECTED\n"):
-                    state = "EXPECTED"
+                    if not skip:
+                        state = "EXPECTED"
+                        expectLine = lineno
                     break
                 if case("DONE\n"):
+                    if state == "EXPECTED" and not ''.join(expect).strip():
+                        self.emptyExpected.append((expectLine, title))
+                    if caseFilter is not None and not skip and not steps \
+                            and not step and not caseFilter.matchTags(tags):
+                        # a case without steps never reached the check
+                        skip = True
                     state = ""
-                    steps.append((''.join(step), ''.join(expect)))
-                    self.testcases.append(TestCase(product, productversion,
-                        suite, title, '\n'.join(description), tags, steps))
+                    if not skip:
+                        steps.append((''.join(step), ''.join(expect)))
+                        parsed = TestCase(product, productversion, suite,
+                            title, '\n'.join(description), tags, steps)
+                        self.caseParsed(parsed)
+                        if hooks.on_case_parsed:
+                            hooks.fire('on_case_parsed', case=parsed,
+                                       line=opened,
+                                       wall=time.time() - caseStart)
+                    skip = False
+                    opened = 0
                     title = ""
                     description = []
                     steps = []
+                    step = []
+                    expect = []
                     break
                 if case():
                     if state == "PRODUCT":
@@ -198,8 +1705,11 @@ class FileParser:
                         suite = line[:-1]
                     elif state == "TITLE":
                         title = line[:-1]
+                        if caseFilter is not None and not skip:
+                            skip = not caseFilter.matchTitle(title)
                     elif state == "DESCRIPTION":
-                        description.append(line[:-1])
+                        if not skip:
+                            description.append(line[:-1])
                     elif state == "TAGS":
                         tags.append(line[:-1]) # drop the new line
                     elif state == "STEP":
@@ -207,6 +1717,133 @@ class FileParser:
                     elif state == "EXPECTED":
                         expect.append(line)
                     break
+        if opened:
+            self.unterminated.append((opened, title))
+        self.context = (product, productversion, suite, tuple(tags))
+
+    def caseParsed(self, case):
+        caseId = len(self.testcases)
+        index = self.index
+        index['product'].setdefault(case.product, []).append(caseId)
+        index['productversion'].setdefault(case.productversion, []).append(caseId)
+        index['suite'].setdefault(case.suite, []).append(caseId)
+        for tag in set(case.tags):
+            index['tag'].setdefault(tag, []).append(caseId)
+        self.testcases.append(case)
+
+
+### Spec Checker
+class CheckParser(FileParser):
+    """Parses a spec without keeping or rendering cases, for --check."""
+
+    def __init__(self, filename, caseFilter=None):
+        self.filename = filename
+        self.cases = 0
+        self.counts = dict((kind, {}) for kind in INDEX_KINDS)
+        self.stepCounts = {}
+        self.start = time.time()
+        FileParser.__init__(self, filename, caseFilter)
+        self.elapsed = time.time() - self.start
+
+    def caseParsed(self, case):
+        self.cases += 1
+        counts = self.counts
+        for kind, value in (('product', case.product),
+                            ('productversion', case.productversion),
+                            ('suite', case.suite)):
+            counts[kind][value] = counts[kind].get(value, 0) + 1
+        for tag in set(case.tags):
+            counts['tag'][tag] = counts['tag'].get(tag, 0) + 1
+        n = len(case.steps)
+        self.stepCounts[n] = self.stepCounts.get(n, 0) + 1
+
+    def ok(self):
+        return not self.unterminated
+
+    def report(self):
+        hist = sorted(self.stepCounts.items())
+        total = sum(n * c for n, c in hist)
+        median, seen = 0, 0
+        for n, c in hist:
+            seen += c
+            if seen > self.cases // 2:
+                median = n
+                break
+        return {
+            'file': self.filename,
+            'cases': self.cases,
+            'counts': self.counts,
+            'steps': {
+                'histogram': dict((str(n), c) for n, c in hist),
+                'min': hist[0][0] if hist else 0,
+                'max': hist[-1][0] if hist else 0,
+                'mean': round(float(total) / self.cases, 2)
+                        if self.cases else 0.0,
+                'median': median,
+            },
+            'empty_expected': [{'line': l, 'title': t}
+                               for l, t in self.emptyExpected],
+            'unterminated': [{'line': l, 'title': t}
+                             for l, t in self.unterminated],
+            'seconds': round(self.elapsed, 4),
+        }
+
+    def textReport(self):
+        r = self.report()
+        out = ["FILE: %s" % r['file'], "CASES: %d" % r['cases']]
+        for kind in INDEX_KINDS:
+            for value, count in sorted(r['counts'][kind].items()):
+                out.append("%s: %s = %d" % (kind.upper(), value, count))
+        s = r['steps']
+        out.append("STEPS: min=%d max=%d mean=%s median=%d" %
+                   (s['min'], s['max'], s['mean'], s['median']))
+        for n, count in sorted(s['histogram'].items(), key=lambda i: int(i[0])):
+            out.append("STEPS: %s = %d" % (n, count))
+        for e in r['empty_expected']:
+            out.append("EMPTY EXPECTED: line %d (%s)" % (e['line'], e['title']))
+        for e in r['unterminated']:
+            out.append("UNTERMINATED: line %d (%s)" % (e['line'], e['title']))
+        out.append("TIME: %ss" % r['seconds'])
+        return '\n'.join(out)
+
+
+### Case Filter
+class CaseFilter:
+    """Predicates a case has to satisfy to be built by FileParser.
+
+    Values of one kind are alternatives, different kinds must all match;
+    ``title`` is a regular expression searched in the case title.
+    """
+
+    def __init__(self, products=None, productversions=None, suites=None,
+                 tags=None, title=None):
+        self.products = set(products or [])
+        self.productversions = set(productversions or [])
+        self.suites = set(suites or [])
+        self.tags = set(tags or [])
+        self.title = re.compile(title) if title else None
+
+    def __nonzero__(self):
+        return bool(self.products or self.productversions or self.suites or
+                    self.tags or self.title)
+    __bool__ = __nonzero__
+
+    def matchHeader(self, product, productversion, suite):
+        return (not self.products or product in self.products) and \
+               (not self.productversions or
+                productversion in self.productversions) and \
+               (not self.suites or suite in self.suites)
+
+    def matchTitle(self, title):
+        return self.title is None or self.title.search(title) is not None
+
+    def matchTags(self, tags):
+        return not self.tags or not self.tags.isdisjoint(tags)
+
+    def match(self, case):
+        return self.matchHeader(case.product, case.productversion,
+                                case.suite) and \
+               self.matchTitle(case.title) and self.matchTags(case.tags)
 
 
 ### Test Case Model
@@ -218,6 +1855,7 @@ class TestCase:
     description = ""
     tags = []
     steps = []
+    ir = None
 
     def __init__(self, product, productversion, suite, title, description, tags, steps):
         self.product = product
@@ -228,6 +1866,23 @@ class TestCase:
         self.tags = tags
         self.steps = steps
 
+    def commands(self):
+        # the Selenese program of this case, compiled once
+        if self.ir is None:
+            self.ir = caseCommands(self)
+        return self.ir
+
+    def digest(self):
+        # identifies the content of a case, not its position
+        fields = [self.product, self.productversion, self.suite, self.title,
+                  self.description, '\1'.join(self.tags)]
+        for instruction, expected in self.steps:
+            fields.extend([instruction, expected])
+        data = '\0'.join(fields)
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        return hashlib.md5(data).hexdigest()
+
     def __str__(self):
         return "Product: " + self.product + "\n" + \
                "Product Version: " + self.productversion + "\n" + \
@@ -257,10 +1912,303 @@ class switch(object):
             return False
 
 
+### Profiling
+class Profiler:
+    """Runs the CLI work under cProfile, tracemalloc or a sampling timer.
+
+    Results go to ``folder``: ``cpu.pstats``/``cpu.txt``, ``mem.txt`` or
+    ``sample.folded`` (collapsed stacks, flamegraph.pl input)/``sample.txt``.
+    """
+
+    MODES = ('cpu', 'mem', 'sample')
+
+    def __init__(self, mode, folder, top=25, interval=0.005):
+        self.mode = mode
+        self.folder = folder
+        self.top = top
+        self.interval = interval
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+    def run(self, func):
+        return getattr(self, self.mode)(func)
+
+    def save(self, name, text):
+        path = '/'.join([self.folder, name])
+        f = open(path, 'w')
+        f.write(text)
+        f.close()
+        log.info("PROFILE: %s", path)
+
+    def cpu(self, func):
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func()
+        finally:
+            profile.disable()
+            profile.dump_stats('/'.join([self.folder, 'cpu.pstats']))
+            out = StringIO()
+            stats = pstats.Stats(profile, stream=out)
+            stats.sort_stats('cumulative').print_stats(self.top)
+            stats.sort_stats('tottime').print_stats(self.top)
+            self.save('cpu.txt', out.getvalue())
+
+    def mem(self, func):
+        try:
+            import tracemalloc
+        except ImportError:
+            tracemalloc = None
+        if tracemalloc is None:
+            return self.memFallback(func)
+        tracemalloc.start(25)
+        before = tracemalloc.take_snapshot()
+        try:
+            return func()
+        finally:
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            sources = (tracemalloc.Filter(True, '*/pywlibs/xhtml.py'),
+                       tracemalloc.Filter(True, '*/tcParser.py'))
+            diff = after.filter_traces(sources).compare_to(
+                before.filter_traces(sources), 'lineno')
+            out = ["traced: current %d bytes, peak %d bytes" % (current, peak),
+                   "top %d allocation sites in pywlibs.xhtml and tcParser:" %
+                   self.top]
+            out.extend([str(d) for d in diff[:self.top]])
+            self.save('mem.txt', '\n'.join(out) + '\n')
+
+    def memFallback(self, func):
+        # no tracemalloc (Python 2): live objects by type and peak RSS
+        import gc
+        log.warning("PROFILE: tracemalloc unavailable, counting objects")
+
+        def census():
+            counts = {}
+            for o in gc.get_objects():
+                name = type(o).__name__
+                counts[name] = counts.get(name, 0) + 1
+            return counts
+
+        before = census()
+        try:
+            return func()
+        finally:
+            gc.collect()
+            after = census()
+            growth = sorted(((after[k] - before.get(k, 0), k) for k in after),
+                            reverse=True)[:self.top]
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            out = ["peak RSS: %d KiB" % rss,
+                   "top %d object types by growth:" % self.top]
+            out.extend(["%10d  %s" % (n, k) for n, k in growth if n > 0])
+            self.save('mem.txt', '\n'.join(out) + '\n')
+
+    def sample(self, func):
+        import signal
+        stacks = {}
+
+        def take(signum, frame):
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append('%s:%s' % (os.path.basename(code.co_filename),
+                                        code.co_name))
+                frame = frame.f_back
+            key = ';'.join(reversed(names))
+            stacks[key] = stacks.get(key, 0) + 1
+
+        previous = signal.signal(signal.SIGPROF, take)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        try:
+            return func()
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            signal.signal(signal.SIGPROF, previous)
+            self.save('sample.folded', ''.join(['%s %d\n' % item for item
+                                                in sorted(stacks.items())]))
+            total = sum(stacks.values()) or 1
+            leaves = {}
+            for key, n in stacks.items():
+                leaf = key.rsplit(';', 1)[-1]
+                leaves[leaf] = leaves.get(leaf, 0) + n
+            out = ["%d samples every %gs" % (total, self.interval)]
+            out.extend(["%6.2f%%  %s" % (100.0 * n / total, leaf) for n, leaf
+                        in sorted(((n, l) for l, n in leaves.items()),
+                                  reverse=True)[:self.top]])
+            self.save('sample.txt', '\n'.join(out) + '\n')
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        usage="python tcParser.py <input> <output> [options]")
+    parser.add_argument('input')
+    parser.add_argument('output', nargs='?',
+                        help="folder, archive (.zip, .tar, .tar.gz) or '-' "
+                             "for framed documents on stdout")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="overlap rendering with a background writer thread")
+    parser.add_argument('--renderers', type=int, default=1,
+                        help="number of rendering threads (or processes)")
+    parser.add_argument('--processes', action='store_true',
+                        help="render in worker processes instead of threads")
+    parser.add_argument('--queue-size', type=int, default=64,
+                        help="bound of the rendered document queue")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip cases the output journal records as written")
+    parser.add_argument('--product', action='append', default=[],
+                        help="only cases of this product (repeatable)")
+    parser.add_argument('--productversion', action='append', default=[],
+                        help="only cases of this product version (repeatable)")
+    parser.add_argument('--suite', action='append', default=[],
+                        help="only cases of this suite (repeatable)")
+    parser.add_argument('--tag', action='append', default=[],
+                        help="only cases carrying this tag (repeatable)")
+    parser.add_argument('--title',
+                        help="only cases whose title matches this regex")
+    parser.add_argument('--suites-by', action='append', default=[],
+                        choices=INDEX_KINDS,
+                        help="also write one testSuite per tag/suite/... "
+                             "linking the shared case files (repeatable)")
+    parser.add_argument('--optimize', action='store_true',
+                        help="emit cheaper Selenese (type instead of "
+                             "sendKeys, no focusing clicks or tag waits)")
+    parser.add_argument('--optimize-report', metavar='FILE',
+                        help="write the per-case optimizer report as JSON")
+    parser.add_argument('--batch', type=int, metavar='N',
+                        help="create N cases per script in one browser "
+                             "session (0: all in one script)")
+    parser.add_argument('--shards', type=int, metavar='N',
+                        help="also split the cases into N testSuite-shardNN "
+                             "suites of about equal predicted run time")
+    parser.add_argument('--durations', action='append', default=[],
+                        metavar='FILE',
+                        help="case run times of earlier runs (CSV, JSON, "
+                             "JUnit XML or Selenese HTML results; "
+                             "repeatable): suites list the longest cases "
+                             "first, --shards balances on them")
+    parser.add_argument('--rerun-failed', action='append', default=[],
+                        metavar='RESULTS',
+                        help="only write testSuite-failed into the output "
+                             "folder, linking the existing files of the "
+                             "cases these results record as failed "
+                             "(formats as --durations; repeatable)")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and regenerate changed cases "
+                             "whenever the input changes")
+    parser.add_argument('--watch-interval', type=float, default=0.5,
+                        metavar='SECONDS',
+                        help="polling interval where inotify is missing")
+    parser.add_argument('--check', action='store_true',
+                        help="only parse the spec and report statistics")
+    parser.add_argument('--format', choices=('text', 'json'), default='text',
+                        help="report format of --check")
+    parser.add_argument('-q', '--quiet', action='store_const', const=-1,
+                        dest='verbosity', default=0,
+                        help="only log warnings and errors")
+    parser.add_argument('-v', '--verbose', action='store_const', const=1,
+                        dest='verbosity', help="log every case and file")
+    parser.add_argument('--progress', type=float, metavar='SECONDS',
+                        default=5.0, help="interval of the progress line")
+    parser.add_argument('--stats', action='store_true',
+                        help="log per-phase timing and throughput")
+    parser.add_argument('--stats-json', metavar='FILE',
+                        help="write the timing report as JSON ('-': stdout)")
+    parser.add_argument('--renderer', choices=RENDERERS, default='slim',
+                        help="template renderer (default) or pywlibs.xhtml")
+    parser.add_argument('--profile', choices=Profiler.MODES,
+                        help="profile the run: cProfile, tracemalloc or "
+                             "stack sampling")
+    parser.add_argument('--profile-dir', default='./profile',
+                        help="folder for the profile output")
+    parser.add_argument('--profile-top', type=int, default=25,
+                        help="entries in the profile summaries")
+    parser.add_argument('--profile-interval', type=float, default=0.005,
+                        help="sampling interval in seconds")
+    args = parser.parse_args(argv)
+    setupLogging(args.verbosity, args.progress)
+    if args.profile:
+        profiler = Profiler(args.profile, args.profile_dir, args.profile_top,
+                            args.profile_interval)
+        return profiler.run(lambda: run(parser, args))
+    return run(parser, args)
+
+
+def run(parser, args):
+    caseFilter = CaseFilter(args.product, args.productversion, args.suite,
+                            args.tag, args.title)
+    if args.check:
+        checker = CheckParser(args.input, caseFilter or None)
+        if args.format == 'json':
+            import json
+            print(json.dumps(checker.report(), indent=2, sort_keys=True))
+        else:
+            print(checker.textReport())
+        return 0 if checker.ok() else 1
+    if args.output is None:
+        parser.error("an output folder is required unless --check is given")
+    output = args.output
+    if output == '-':
+        output = StreamSink(getattr(sys.stdout, 'buffer', sys.stdout))
+    elif ArchiveSink.format(output):
+        output = ArchiveSink(output)
+    if not isinstance(output, str) and (args.resume or args.watch or
+                                        args.rerun_failed):
+        parser.error("--resume, --watch and --rerun-failed need an output "
+                     "folder")
+    if args.rerun_failed:
+        rerunFailed(args.input, output, args.rerun_failed,
+                    caseFilter or None, args.renderer)
+        return 0
+    if args.batch is not None and (args.suites_by or args.watch):
+        parser.error("--batch writes scripts, not case files; it does not "
+                     "combine with --suites-by or --watch")
+    if args.shards is not None and (args.shards < 1 or args.watch):
+        parser.error("--shards needs N >= 1 and does not combine with --watch")
+    if args.durations and args.watch:
+        parser.error("--durations does not combine with --watch")
+    history = None
+    if args.durations:
+        # the output journal still maps the case files of the last run
+        history = RunHistory(args.durations, args.output
+                             if isinstance(output, str) else None)
+    stats = RunStats() if args.stats or args.stats_json else None
+    generator = XhtmlParser(args.input, output, pipeline=args.pipeline,
+                            renderers=args.renderers,
+                            processes=args.processes,
+                            queueSize=args.queue_size, resume=args.resume,
+                            caseFilter=caseFilter or None,
+                            suitesBy=args.suites_by, stats=stats,
+                            renderer=args.renderer,
+                            optimize=args.optimize or
+                            bool(args.optimize_report), batch=args.batch,
+                            shards=args.shards, history=history)
+    if args.optimize_report:
+        import json
+        f = open(args.optimize_report, 'w')
+        json.dump(generator.optimizer.report(), f, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        f.close()
+    if args.stats:
+        log.info(stats.summary())
+    if args.stats_json:
+        import json
+        if args.stats_json == '-':
+            print(json.dumps(stats.report(), indent=2, sort_keys=True))
+        else:
+            f = open(args.stats_json, 'w')
+            json.dump(stats.report(), f, indent=2, sort_keys=True)
+            f.close()
+    if args.watch:
+        Watcher(args.input, args.output, caseFilter or None, args.suites_by,
+                args.renderer, args.watch_interval,
+                generator.optimizer is not None).watch()
+    return 0
+
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("There should have two arguments")
-        print("python tcParser.py <input> <output>")
-        print(sys.argv)
-    else:
-        XhtmlParser(sys.argv[1], sys.argv[2])
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+"""Long-lived generation server for tcParser.
+
+Keeps the interpreter, imports, renderers and rendered cases warm between
+requests, so editors can regenerate a suite per save without paying
+start-up each time.
+
+    python tcServer.py [--port 8765 | --socket /tmp/tcparser.sock]
+
+    POST /generate[?format=json|zip|tar][&suites-by=tag][&tag=...]
+         body: spec text; answer: the case files and testSuite(s)
+    GET  /health
+"""
+
+import collections
+import io
+import json
+import logging
+import os
+import re
+import socket
+import sys
+import threading
+import time
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+try:
+    import SocketServer as socketserver
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    import socketserver
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+
+import tcParser
+
+log = logging.getLogger('tcParser.server')
+
+
+### In-memory Generation
+class Generator:
+    """Parses spec text and renders it in memory, caching rendered cases.
+
+    Rendered documents are cached by (file name, case digest), so an
+    unchanged case is never rendered twice while the server is up.
+    """
+
+    def __init__(self, renderer='slim', cacheSize=20000):
+        self.renderer = renderer
+        self.cacheSize = cacheSize
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def xhtml(self):
+        # pywlibs generators keep per-call state, one per thread
+        X = getattr(self.local, 'X', None)
+        if X is None:
+            X = self.local.X = tcParser.xhtmlGenerator(self.renderer)
+            self.local.parser = tcParser.XhtmlParser(renderer=self.renderer)
+        return X, self.local.parser
+
+    def generate(self, text, caseFilter=None, suitesBy=()):
+        """Returns [(name, document)], cases first, then the suites."""
+        X, parser = self.xhtml()
+        parser.caseList = []
+        fp = tcParser.FileParser(lines=text.splitlines(True),
+                                 caseFilter=caseFilter)
+        files = []
+        for index, case in enumerate(fp.testcases):
+            fn = str(index).zfill(6)
+            parser.caseList.append(fn)
+            files.append((fn, self.render(X, parser, fn, case)))
+        files.append(('testSuite', parser.suiteDocument(X, parser.caseList)))
+        for kind in suitesBy:
+            for name, links, title in parser.indexSuites(fp.index[kind], kind):
+                files.append((name, parser.suiteDocument(X, links, title)))
+        return files
+
+    def render(self, X, parser, fn, case):
+        key = (fn, case.digest())
+        with self.lock:
+            doc = self.cache.get(key)
+            if doc is not None:
+                self.hits += 1
+                # keep recently used entries at the end
+                del self.cache[key]
+                self.cache[key] = doc
+                return doc
+            self.misses += 1
+        doc = parser.caseRender(X, fn, case)
+        with self.lock:
+            self.cache[key] = doc
+            while len(self.cache) > self.cacheSize:
+                self.cache.popitem(last=False)
+        return doc
+
+
+def archive(files, fmt):
+    buf = io.BytesIO()
+    sink = tcParser.ArchiveSink(buf, fmt)
+    for name, doc in files:
+        sink.write(name, doc)
+    sink.close()
+    return buf.getvalue()
+
+
+### HTTP Front End
+class RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # keep-alive for editor plugins
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/health':
+            return self.reply(404, 'text/plain', b'not found\n')
+        g = self.server.generator
+        body = json.dumps({'status': 'ok', 'renderer': g.renderer,
+                           'cached': len(g.cache), 'hits': g.hits,
+                           'misses': g.misses,
+                           'requests': self.server.requests})
+        self.reply(200, 'application/json', body.encode('utf-8'))
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/generate':
+            return self.reply(404, 'text/plain', b'not found\n')
+        start = time.time()
+        # read the body first, so an error reply keeps the connection usable
+        length = int(self.headers.get('Content-Length') or 0)
+        text = self.rfile.read(length)
+        if not isinstance(text, str):
+            text = text.decode('utf-8')
+        query = parse_qs(url.query)
+        fmt = query.get('format', ['json'])[0]
+        if fmt not in ('json', 'zip', 'tar'):
+            return self.reply(400, 'text/plain', b'unknown format\n')
+        suitesBy = query.get('suites-by', [])
+        if [k for k in suitesBy if k not in tcParser.INDEX_KINDS]:
+            return self.reply(400, 'text/plain', b'unknown suites-by\n')
+        try:
+            caseFilter = tcParser.CaseFilter(
+                query.get('product'), query.get('productversion'),
+                query.get('suite'), query.get('tag'),
+                query.get('title', [None])[0])
+        except re.error as e:
+            return self.reply(400, 'text/plain',
+                              ('bad title pattern: %s\n' % e).encode('utf-8'))
+        try:
+            files = self.server.generator.generate(text, caseFilter or None,
+                                                   suitesBy)
+        except Exception as e:
+            log.exception("generate failed")
+            return self.reply(500, 'text/plain',
+                              ('%s\n' % e).encode('utf-8'))
+        with self.server.lock:
+            self.server.requests += 1
+        if fmt == 'json':
+            body = json.dumps({'order': [name for name, doc in files],
+                               'files': dict(files),
+                               'ms': round((time.time() - start) * 1000, 3)})
+            self.reply(200, 'application/json', body.encode('utf-8'))
+        else:
+            self.reply(200, 'application/' + ('zip' if fmt == 'zip'
+                                              else 'x-tar'),
+                       archive(files, fmt))
+
+    def setup(self):
+        # small responses on keep-alive would otherwise wait for delayed ACKs
+        if self.server.address_family != getattr(socket, 'AF_UNIX', None):
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        BaseHTTPRequestHandler.setup(self)
+
+    def reply(self, code, contentType, body):
+        self.send_response(code)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # unix sockets have no peer address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        log.debug("%s %s", self.address_string(), format % args)
+
+
+### Worker Pool
+class PooledMixIn:
+    """Hands accepted connections to a fixed pool of worker threads."""
+
+    workers = 4
+
+    def startWorkers(self):
+        self.requestQueue = queue.Queue(self.workers * 8)
+        for i in range(self.workers):
+            t = threading.Thread(target=self.work)
+            t.daemon = True
+            t.start()
+
+    def process_request(self, request, client_address):
+        self.requestQueue.put((request, client_address))
+
+    def work(self):
+        while True:
+            request, client_address = self.requestQueue.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+
+class TCPServer(PooledMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixServer(PooledMixIn, socketserver.UnixStreamServer):
+        pass
+
+
+def makeServer(host='127.0.0.1', port=8765, socketPath=None, workers=4,
+               renderer='slim', cacheSize=20000):
+    if socketPath:
+        if os.path.exists(socketPath):
+            os.unlink(socketPath)
+        server = UnixServer(socketPath, RequestHandler)
+    else:
+        server = TCPServer((host, port), RequestHandler)
+    server.workers = workers
+    server.generator = Generator(renderer, cacheSize)
+    server.requests = 0
+    server.lock = threading.Lock()  # the counter is bumped by pool threads
+    server.startWorkers()
+    return server
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        usage="python tcServer.py [--port N | --socket PATH] [options]")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help="listen on a Unix socket instead")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--cache-size', type=int, default=20000,
+                        help="rendered cases kept between requests")
+    parser.add_argument('--renderer', choices=tcParser.RENDERERS,
+                        default='slim')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+    # per-request lines only with -v, tcParser's own chatter stays quiet
+    tcParser.setupLogging(1 if args.verbose else -1)
+    if not args.verbose:
+        log.setLevel(logging.INFO)
+
+    server = makeServer(args.host, args.port, args.socket, args.workers,
+                        args.renderer, args.cache_size)
+    log.info("SERVE: %s", args.socket or 'http://%s:%d/' % (args.host,
+                                                             args.port))
+    for handler in tcParser.log.handlers:
+        handler.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+"""Creates parsed test cases in MozTrap through its REST API.
+
+    python tcUpload.py <input> --url https://moztrap.example.com \
+        --username NAME --api-key KEY [--concurrency 4]
+
+Products, versions, suites and tags are looked up once per run.  MozTrap's
+list endpoints create one object per ``POST``, so a case is a ``case``,
+its ``caseversion`` (with its tag URIs), one ``casestep`` per step and a
+``suitecase``; cases go out in parallel over keep-alive connections, one
+per worker thread.  Refused requests (429, 503) are retried with
+exponential backoff.  A request that may have been applied (connection
+lost, 500/502/504) is not sent blindly again: the case is retried in
+careful mode, which looks every object up before creating it, finding
+its caseversion by the ledger key at the end of the description.  Every
+created case is recorded in a ledger next to the spec, keyed by its
+content digest, so a rerun only sends what the server does not have yet.
+
+The payloads follow MozTrap's documented case, caseversion, casestep,
+suitecase and tag resources; check them against the target instance on a
+few cases first.  ``python -m benchmarks.moztrap`` runs an upload against
+a local stub that validates the same shapes.
+"""
+
+import json
+import logging
+import random
+import socket
+import sys
+import threading
+import time
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+try:
+    from httplib import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib import urlencode
+    from urlparse import urlparse
+except ImportError:
+    from http.client import HTTPConnection, HTTPSConnection, HTTPException
+    from urllib.parse import urlencode, urlparse
+
+import tcParser
+
+log = logging.getLogger('tcParser.upload')
+
+API = '/api/v1/'
+
+
+class UploadError(Exception):
+    pass
+
+
+class AmbiguousError(UploadError):
+    """A request failed in a way that leaves open whether it was applied."""
+
+
+def uriId(uri):
+    # '/api/v1/case/42/' -> '42', the filter value of a foreign key
+    return uri.rstrip('/').rsplit('/', 1)[-1]
+
+
+### HTTP Client
+class Client:
+    """JSON requests over one keep-alive connection per thread.
+
+    Connection errors and 429/5xx answers are retried ``retries`` times,
+    waiting ``backoff * 2**attempt`` seconds (with jitter, or the server's
+    Retry-After) in between.  With ``retry=False`` (requests that create
+    something) only the refusals in ``REFUSED`` are retried; failures that
+    may have been applied raise AmbiguousError for the caller to resolve.
+    """
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    REFUSED = (429, 503)
+
+    def __init__(self, url, username=None, apiKey=None, retries=5,
+                 backoff=0.1, timeout=30.0):
+        parts = urlparse(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.auth = urlencode([('username', username),
+                               ('api_key', apiKey)]) if apiKey else ''
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retried = 0
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            cls = HTTPSConnection if self.https else HTTPConnection
+            conn = self.local.conn = cls(self.host, self.port,
+                                         timeout=self.timeout)
+            conn.connect()
+            conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def pause(self, attempt, delay=None):
+        with self.lock:
+            self.retried += 1
+        if delay is None:
+            delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+        time.sleep(delay)
+
+    def request(self, method, path, body=None, headers=None, retry=True):
+        """Returns the decoded answer; for a created object without a body
+        ``{'resource_uri': <path of its Location>}``."""
+        url = self.prefix + path
+        if self.auth:
+            url += ('&' if '?' in path else '?') + self.auth
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        allHeaders = {'Content-Type': 'application/json',
+                      'Accept': 'application/json'}
+        allHeaders.update(headers or {})
+        attempt = 0
+        while True:
+            delay = None
+            try:
+                conn = self.connection()
+                conn.request(method, url, data, allHeaders)
+                response = conn.getresponse()
+                payload = response.read()
+            except (socket.error, HTTPException) as e:
+                # dropped keep-alive connections end up here too
+                self.close()
+                status, reason = None, str(e)
+            else:
+                status, reason = response.status, response.reason
+                if 400 <= status < 500 and payload:
+                    reason += ' ' + payload.decode('utf-8', 'replace')[:200]
+                if status < 300:
+                    with self.lock:
+                        self.requests += 1
+                    if payload:
+                        return json.loads(payload.decode('utf-8'))
+                    location = response.getheader('Location')
+                    return {'resource_uri': urlparse(location).path} \
+                        if location else None
+                retryAfter = response.getheader('Retry-After')
+                if retryAfter and retryAfter.isdigit():
+                    delay = float(retryAfter)
+            if not retry and status not in self.REFUSED and \
+                    (status is None or status >= 500):
+                raise AmbiguousError("%s %s: %s %s" % (method, path, status,
+                                                       reason))
+            if (status is not None and status not in self.RETRY_STATUS) or \
+                    attempt >= self.retries:
+                raise UploadError("%s %s: %s %s" % (method, path, status,
+                                                    reason))
+            log.debug("RETRY: %s %s after %s %s", method, path, status, reason)
+            self.pause(attempt, delay)
+            attempt += 1
+
+
+### Upload Ledger
+class Ledger:
+    """Append-only record of the cases a server has accepted.
+
+    Each line is ``<server url>\t<case key>``; keys are the case digest
+    plus ``#n`` for the n-th copy of identical cases in one spec.
+    """
+
+    def __init__(self, path, url):
+        self.url = url
+        self.keys = set()
+        try:
+            f = open(path, 'r')
+        except IOError:
+            pass
+        else:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if line.endswith('\n') and len(fields) == 2 and \
+                        fields[0] == url:
+                    self.keys.add(fields[1])
+            f.close()
+        self.lock = threading.Lock()
+        self.f = open(path, 'a')
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def record(self, keys):
+        with self.lock:
+            self.f.write(''.join(['%s\t%s\n' % (self.url, key)
+                                  for key in keys]))
+            self.f.flush()
+            self.keys.update(keys)
+
+    def close(self):
+        self.f.close()
+
+
+def caseKeys(cases):
+    # stable identity of each case: content digest, numbered among copies
+    seen = {}
+    keys = []
+    for case in cases:
+        digest = case.digest()
+        seen[digest] = seen.get(digest, 0) + 1
+        keys.append('%s#%d' % (digest, seen[digest]))
+    return keys
+
+
+### Uploader
+class Uploader:
+    """Creates cases in MozTrap from a pool of worker threads.
+
+    Every caseversion carries its ledger key at the end of its
+    description (``MARKER``).  After an ambiguous failure a case is
+    created again in careful mode: only a caseversion of the product
+    version with this name and this key is taken as already created, so
+    an older upload or another case with the same title never is, and
+    its steps and suite membership are looked up by their keys, so
+    nothing is created twice.  A ``case`` whose creation was lost before
+    its version is the only object that can be left behind, without
+    versions.
+    """
+
+    MARKER = '\n\n[tcUpload %s]'
+
+    def __init__(self, client, ledger, concurrency=4):
+        self.client = client
+        self.ledger = ledger
+        self.concurrency = max(1, concurrency)
+        self.uris = {}
+        self.lock = threading.Lock()
+        self.tagLock = threading.Lock()
+
+    def find(self, kind, **query):
+        found = self.client.request('GET', '%s%s/?%s' % (
+            API, kind, urlencode(sorted(query.items()))))
+        return (found or {}).get('objects') or []
+
+    def uri(self, kind, **query):
+        # resource_uri of an existing product/productversion/suite
+        key = (kind, tuple(sorted(query.items())))
+        with self.lock:
+            if key in self.uris:
+                return self.uris[key]
+        objects = self.find(kind, **query)
+        if not objects:
+            raise UploadError("no %s matches %r" % (kind, query))
+        with self.lock:
+            self.uris[key] = objects[0]['resource_uri']
+        return self.uris[key]
+
+    def tag(self, product, name):
+        # one tag per product and name, created on first use
+        key = ('tag', product, name)
+        with self.tagLock:
+            if key not in self.uris:
+                objects = self.find('tag', product=uriId(product), name=name)
+                self.uris[key] = objects[0]['resource_uri'] if objects else \
+                    self.create('tag', {'name': name, 'product': product})
+            return self.uris[key]
+
+    def create(self, kind, data, careful=False, **lookup):
+        if careful:
+            objects = self.find(kind, **lookup)
+            if objects:
+                return objects[0]['resource_uri']
+        return self.client.request('POST', '%s%s/' % (API, kind), data,
+                                   retry=False)['resource_uri']
+
+    def send(self, key, case, careful=False):
+        product = self.uri('product', name=case.product)
+        version = self.uri('productversion', product__name=case.product,
+                           version=case.productversion)
+        tags = []
+        for tag in case.tags:
+            if self.tag(product, tag) not in tags:
+                tags.append(self.tag(product, tag))
+        description = case.description + self.MARKER % key
+        existing = None
+        if careful:
+            for found in self.find('caseversion',
+                                   productversion=uriId(version),
+                                   name=case.title):
+                # the key names this content; servers may trim or
+                # rewrap the text before it
+                if (found.get('description') or '').rstrip().endswith(
+                        (self.MARKER % key).strip()):
+                    existing = found
+                    break
+        if existing is None:
+            caseUri = self.create('case', {'product': product,
+                                           'idprefix': '', 'priority': None})
+            caseversion = self.create('caseversion', {
+                'case': caseUri, 'productversion': version,
+                'name': case.title, 'description': description,
+                'status': 'draft', 'tags': tags})
+        else:
+            caseUri = existing['case']
+            caseversion = existing['resource_uri']
+        for i, (instruction, expected) in enumerate(case.steps):
+            self.create('casestep', {'caseversion': caseversion,
+                                     'number': i + 1,
+                                     'instruction': instruction,
+                                     'expected': expected},
+                        careful, caseversion=uriId(caseversion), number=i + 1)
+        if case.suite:
+            suite = self.uri('suite', product__name=case.product,
+                             name=case.suite)
+            self.create('suitecase', {'case': caseUri, 'suite': suite,
+                                      'order': 0},
+                        careful, case=uriId(caseUri), suite=uriId(suite))
+
+    def upload(self, cases):
+        start = time.time()
+        todo = queue.Queue()
+        count = 0
+        for key, case in zip(caseKeys(cases), cases):
+            if key not in self.ledger:
+                todo.put((key, case))
+                count += 1
+        errors = []
+        self.resolved = 0
+
+        def work():
+            try:
+                while not errors:
+                    try:
+                        key, case = todo.get_nowait()
+                    except queue.Empty:
+                        return
+                    attempt = 0
+                    while True:
+                        try:
+                            self.send(key, case, careful=attempt > 0)
+                            break
+                        except AmbiguousError as e:
+                            if attempt >= self.client.retries:
+                                raise
+                            log.debug("RETRY: %s carefully after %s", key, e)
+                            self.client.pause(attempt)
+                            attempt += 1
+                    if attempt:
+                        with self.lock:
+                            self.resolved += 1
+                    self.ledger.record([key])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                self.client.close()
+
+        threads = [threading.Thread(target=work)
+                   for i in range(min(self.concurrency, count))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        seconds = time.time() - start
+        return {'cases': len(cases), 'sent': count,
+                'skipped': len(cases) - count,
+                'resolved': self.resolved,
+                'requests': self.client.requests,
+                'retries': self.client.retried,
+                'seconds': round(seconds, 3),
+                'cases_per_second': round(count / seconds, 1)
+                if seconds else 0.0}
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        usage="python tcUpload.py <input> --url URL [options]")
+    parser.add_argument('input')
+    parser.add_argument('--url', required=True, help="MozTrap base URL")
+    parser.add_argument('--username')
+    parser.add_argument('--api-key')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="parallel connections")
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--backoff', type=float, default=0.1,
+                        help="first retry delay in seconds, doubled after")
+    parser.add_argument('--ledger',
+                        help="record of accepted cases "
+                             "(default: <input>.uploaded)")
+    parser.add_argument('-q', '--quiet', action='store_const', const=-1,
+                        dest='verbosity', default=0)
+    parser.add_argument('-v', '--verbose', action='store_const', const=1,
+                        dest='verbosity')
+    args = parser.parse_args(argv)
+    tcParser.setupLogging(args.verbosity)
+
+    cases = tcParser.FileParser(args.input).testcases
+    client = Client(args.url, args.username, args.api_key, args.retries,
+                    args.backoff)
+    ledger = Ledger(args.ledger or args.input + '.uploaded', args.url)
+    try:
+        result = Uploader(client, ledger, args.concurrency).upload(cases)
+    except UploadError as e:
+        log.error("UPLOAD: %s", e)
+        return 1
+    finally:
+        ledger.close()
+    log.info("UPLOAD: %s", ', '.join(['%s=%s' % item for item
+                                      in sorted(result.items())]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Behaviour tests for tcParser, run from the repository root:
+
+    python -m pytest -q tests
+    python -m unittest discover -s tests -t .
+"""
+
+import shutil
+import tempfile
+
+import tcParser
+
+
+def spec(*cases):
+    """Spec text of (title, tags, steps) cases, product P 1.0 suite S."""
+    out = [u'PRODUCT\nP\nPRODUCTVERSION\n1.0\nSUITE\nS\n']
+    for title, tags, steps in cases:
+        out.append(u'TITLE\n%s\nDESCRIPTION\nabout %s\nTAGS\n' % (title, title))
+        out.extend([tag + u'\n' for tag in tags])
+        for instruction, expected in steps:
+            out.append(u'STEP\n%s\nEXPECTED\n%s\n' % (instruction, expected))
+        out.append(u'DONE\n')
+    return u''.join(out)
+
+
+def parse(text, caseFilter=None):
+    return tcParser.FileParser(lines=text.splitlines(True),
+                               caseFilter=caseFilter).testcases
+
+
+class Rendered:
+    """Counts the cases rendered while registered on tcParser.hooks."""
+
+    def __init__(self):
+        self.names = []
+        tcParser.hooks.register('on_case_rendered', self)
+
+    def __call__(self, name, **payload):
+        self.names.append(name)
+
+    def close(self):
+        tcParser.hooks.unregister('on_case_rendered', self)
+
+
+class TempFolder:
+    """mkdtemp with cleanup, for setUp/tearDown."""
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix='tcparser-test-')
+
+    def join(self, *names):
+        return '/'.join((self.path,) + names)
+
+    def write(self, name, text):
+        f = open(self.join(name), 'wb')
+        f.write(text.encode('utf-8'))
+        f.close()
+        return self.join(name)
+
+    def read(self, name):
+        f = open(self.join(name), 'rb')
+        data = f.read()
+        f.close()
+        return data.decode('utf-8')
+
+    def close(self):
+        shutil.rmtree(self.path)
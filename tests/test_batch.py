@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import tcParser
+from tests import TempFolder, spec, parse
+
+CASES = [(u'one', [u'a'], [(u'tap', u'ok')]),
+         (u'two', [], [(u'swipe', u'ok')]),
+         (u'three', [u'b'], [(u'call', u'rings')]),
+         (u'four', [], [(u'hold', u'menu')]),
+         (u'five', [u'a'], [(u'shake', u'undo')])]
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cases = parse(spec(*CASES))
+
+    def testBatchSizes(self):
+        self.assertEqual([len(b.cases) for b
+                          in tcParser.caseBatches(self.cases, 2)], [2, 2, 1])
+        self.assertEqual([len(b.cases) for b
+                          in tcParser.caseBatches(self.cases, 0)], [5])
+
+    def testOnlyTheFirstCaseOpensTheList(self):
+        batch = tcParser.caseBatches(self.cases, 0)[0]
+        commands = batch.commands()
+        self.assertEqual([c for c in commands if c[0] == 'open'],
+                         [self.cases[0].commands()[0]])
+        self.assertEqual(len(commands),
+                         sum([len(c.commands()) for c in self.cases]) - 4)
+
+    def testPageLoads(self):
+        single = sum([tcParser.pageLoads(c.commands()) for c in self.cases])
+        batch = tcParser.pageLoads(
+            tcParser.caseBatches(self.cases, 0)[0].commands())
+        self.assertEqual(single - batch, 4)
+
+    def testDigestFollowsItsCases(self):
+        a = tcParser.caseBatches(self.cases, 2)
+        b = tcParser.caseBatches(parse(spec(*CASES)), 2)
+        self.assertEqual([x.digest() for x in a], [x.digest() for x in b])
+        self.assertNotEqual(a[0].digest(), a[1].digest())
+
+    def testOneScriptPerBatch(self):
+        tmp = TempFolder()
+        try:
+            sink = tcParser.MemorySink()
+            tcParser.XhtmlParser(tmp.write('spec', spec(*CASES)), sink,
+                                 batch=2)
+            self.assertEqual(sink.order, ['000000', '000001', '000002',
+                                          'testSuite'])
+            script = sink.files['000000'].decode('utf-8')
+            self.assertTrue(u'one' in script and u'two' in script)
+            self.assertFalse(u'three' in script)
+        finally:
+            tmp.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+import tcParser
+from tests import TempFolder, spec
+
+SPEC = spec((u'one', [u'a'], [(u'tap', u'ok'), (u'swipe', u'')]),
+            (u'two', [u'a', u'b'], [(u'call', u'rings')]),
+            (u'three', [], [])) + u'TITLE\nfour\nSTEP\nunfinished\n'
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class CheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+        self.spec = self.tmp.write('spec', SPEC)
+        self.checker = tcParser.CheckParser(self.spec)
+
+    def tearDown(self):
+        self.tmp.close()
+
+    def testCounts(self):
+        report = self.checker.report()
+        self.assertEqual(report['cases'], 3)
+        self.assertEqual(report['counts']['tag'], {u'a': 2, u'b': 1})
+        self.assertEqual(report['counts']['suite'], {u'S': 3})
+        self.assertEqual(report['steps']['histogram'],
+                         {'1': 2, '2': 1})
+        self.assertEqual(report['steps']['median'], 1)
+
+    def testProblemsAreReported(self):
+        report = self.checker.report()
+        self.assertEqual([e['title'] for e in report['empty_expected']],
+                         [u'one'])
+        self.assertEqual(report['unterminated'],
+                         [{'line': SPEC.count(u'\n') - 3, 'title': u'four'}])
+        self.assertFalse(self.checker.ok())
+
+    def testNothingIsKept(self):
+        self.assertEqual(self.checker.testcases, [])
+
+    def check(self, path, *options):
+        proc = subprocess.Popen([sys.executable, 'tcParser.py', path,
+                                 '--check'] + list(options), cwd=ROOT,
+                                stdout=subprocess.PIPE)
+        output = proc.communicate()[0]
+        return proc.returncode, output.decode('utf-8')
+
+    def testExitStatus(self):
+        status, output = self.check(self.spec, '--format', 'json')
+        self.assertEqual(status, 1)
+        self.assertEqual(json.loads(output)['cases'], 3)
+        good = self.tmp.write('good', spec((u'one', [], [(u'tap', u'ok')])))
+        self.assertEqual(self.check(good)[0], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
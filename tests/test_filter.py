@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import tcParser
+from tests import spec, parse
+
+SPEC = spec((u'no steps', [u'foo'], []),
+            (u'with step', [u'bar'], [(u'tap', u'done')]),
+            (u'both tags', [u'foo', u'bar'], [(u'tap', u'done')]))
+
+
+class CaseFilterTest(unittest.TestCase):
+
+    def titles(self, **kwargs):
+        return [case.title for case
+                in parse(SPEC, tcParser.CaseFilter(**kwargs))]
+
+    def testNoFilterKeepsEverything(self):
+        self.assertEqual(self.titles(),
+                         [u'no steps', u'with step', u'both tags'])
+
+    def testTagOfCaseWithSteps(self):
+        self.assertEqual(self.titles(tags=[u'bar']),
+                         [u'with step', u'both tags'])
+
+    def testTagOfCaseWithoutSteps(self):
+        self.assertEqual(self.titles(tags=[u'foo']),
+                         [u'no steps', u'both tags'])
+
+    def testTagsAreAlternatives(self):
+        self.assertEqual(len(self.titles(tags=[u'foo', u'bar'])), 3)
+
+    def testTitleRegex(self):
+        self.assertEqual(self.titles(title=u'^with'), [u'with step'])
+
+    def testKindsMustAllMatch(self):
+        self.assertEqual(self.titles(tags=[u'bar'], title=u'both'),
+                         [u'both tags'])
+        self.assertEqual(self.titles(tags=[u'bar'], suites=[u'other']), [])
+
+    def testHeaderFieldsAreInherited(self):
+        text = SPEC + u'SUITE\nT\nTITLE\nin t\nDESCRIPTION\nd\nTAGS\nfoo\n' \
+            u'STEP\ns\nEXPECTED\ne\nDONE\n'
+        titles = [case.title for case
+                  in parse(text, tcParser.CaseFilter(suites=[u'T']))]
+        self.assertEqual(titles, [u'in t'])
+
+    def testSkippedCasesKeepTheStepsOfOthersApart(self):
+        case = parse(SPEC, tcParser.CaseFilter(tags=[u'bar']))[0]
+        self.assertEqual(case.steps, [(u'tap\n', u'done\n')])
+        self.assertEqual(case.tags, [u'bar'])
+
+
+if __name__ == '__main__':
+    unittest.main()
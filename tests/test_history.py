@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import tcParser
+from tests import TempFolder, spec, parse
+
+CASES = parse(spec((u'short', [], [(u'tap', u'ok')]),
+                   (u'long', [], [(u'tap', u'ok')]),
+                   (u'new', [], [(u'tap', u'ok')])))
+
+
+class RunHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+
+    def tearDown(self):
+        self.tmp.close()
+
+    def history(self, name, text, journal=None):
+        return tcParser.RunHistory([self.tmp.write(name, text)], journal)
+
+    def testCsv(self):
+        h = self.history('t.csv', u'case,seconds,status\nshort,2.5,passed\n'
+                                  u'long,30,failed\nlong,40,passed\n')
+        self.assertEqual(h.duration(CASES[0]), 2.5)
+        self.assertEqual(h.duration(CASES[1]), 35.0)
+        self.assertEqual(h.duration(CASES[2]), None)
+        self.assertEqual(h.failed(), [])
+
+    def testJsonByDigest(self):
+        h = self.history('t.json', u'{"%s": 12}' % CASES[1].digest())
+        self.assertEqual(h.duration(CASES[1]), 12.0)
+
+    def testJunit(self):
+        h = self.history('t.xml', u'<testsuite>'
+                         u'<testcase name="short" time="1.5"/>'
+                         u'<testcase name="long" time="9">'
+                         u'<failure message="x"/></testcase></testsuite>')
+        self.assertEqual(h.duration(CASES[0]), 1.5)
+        self.assertEqual(h.failed(), [u'long'])
+
+    def testSeleneseHtmlFileNamesThroughJournal(self):
+        out = self.tmp.join('out')
+        tcParser.XhtmlParser(self.tmp.write('spec', spec(
+            (u'short', [], [(u'tap', u'ok')]),
+            (u'long', [], [(u'tap', u'ok')]))), out)
+        h = self.history('r.html', u'<table>'
+                         u'<tr class="status_passed"><td><a href="#r0">'
+                         u'000000</a></td><td>4 s</td></tr>'
+                         u'<tr class="status_failed"><td><a href="#r1">'
+                         u'000001</a></td></tr></table>', out)
+        self.assertEqual(h.duration(CASES[0]), 4.0)
+        self.assertEqual(h.failed(), [CASES[1].digest()])
+
+    def testFileNamesAfterResume(self):
+        out = self.tmp.join('out')
+        cases = [(u'short', [], [(u'tap', u'ok')]),
+                 (u'long', [], [(u'tap', u'ok')])]
+        path = self.tmp.write('spec', spec(*cases))
+        tcParser.XhtmlParser(path, out)
+        cases[1] = (u'long', [], [(u'tap twice', u'ok')])
+        self.tmp.write('spec', spec(*cases))
+        tcParser.XhtmlParser(path, out, resume=True)
+        h = self.history('t.csv', u'000001,40,failed\n', out)
+        edited = parse(spec(*cases))[1]
+        self.assertEqual(h.duration(edited), 40.0)
+        self.assertEqual(h.failed(), [edited.digest()])
+
+    def testCaseFileNameForms(self):
+        h = self.history('t.csv', u'test_create_case[000042],1\n'
+                                  u'some title [000043],2\n000044,3\n')
+        self.assertEqual(sorted(h.seconds), ['000042', '000043', '000044'])
+
+    def testTitlesStartingWithANumber(self):
+        h = self.history('t.csv', u'100000 contacts import,2\n')
+        self.assertEqual(list(h.seconds), [u'100000 contacts import'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import unittest
+
+import tcExport
+from tests import spec, parse
+
+TEXT = spec((u'one', [u'a', u'b'], [(u'tap', u'ok'), (u'swipe', u'gone')]),
+            (u'två', [u'b'], [(u'tap', u'ok')])) + \
+    spec((u'three', [u'a'], [(u'swipe', u'gone')])).replace(
+        u'SUITE\nS\n', u'SUITE\nT\n')
+
+
+class ImportExportTest(unittest.TestCase):
+
+    def setUp(self):
+        exporter = tcExport.ImportExport(lines=TEXT.splitlines(True))
+        out = io.BytesIO()
+        exporter.write(out)
+        self.doc = json.loads(out.getvalue().decode('ascii'))
+
+    def testTagsAndStepsAreListedOnce(self):
+        self.assertEqual(self.doc['tags'], [u'a', u'b'])
+        self.assertEqual([s['instruction'] for s in self.doc['steps']],
+                         [u'tap\n', u'swipe\n'])
+
+    def testCasesAreGroupedBySuite(self):
+        self.assertEqual(self.doc['cases'], 3)
+        products = self.doc['products']
+        self.assertEqual([p['name'] for p in products], [u'P'])
+        versions = products[0]['versions']
+        self.assertEqual([v['version'] for v in versions], [u'1.0'])
+        suites = versions[0]['suites']
+        self.assertEqual([(s['name'], [c['name'] for c in s['cases']])
+                          for s in suites],
+                         [(u'S', [u'one', u'två']), (u'T', [u'three'])])
+
+    def testCasesReferToTheTables(self):
+        cases = parse(TEXT)
+        exported = [c for s in self.doc['products'][0]['versions'][0]['suites']
+                    for c in s['cases']]
+        for case, record in zip(cases, exported):
+            self.assertEqual(record['description'], case.description)
+            self.assertEqual([self.doc['tags'][i] for i in record['tags']],
+                             list(case.tags))
+            self.assertEqual([(self.doc['steps'][i]['instruction'],
+                               self.doc['steps'][i]['expected'])
+                              for i in record['steps']],
+                             [tuple(step) for step in case.steps])
+
+
+if __name__ == '__main__':
+    unittest.main()
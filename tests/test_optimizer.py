@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import tcParser
+from tests import spec, parse
+
+CASE = parse(spec((u'title', [u'music'],
+                   [(u'first', u'seen'), (u'second', u'')])))[0]
+
+
+class OptimizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.commands = CASE.commands()
+        self.optimized = tcParser.optimizeCommands(self.commands)
+
+    def testSendKeysBecomesType(self):
+        self.assertFalse([c for c in self.optimized if c[0] == 'sendKeys'])
+        self.assertTrue(('type', 'id=id_name', u'title') in self.optimized)
+
+    def testEmptyTextsAreDropped(self):
+        self.assertFalse([c for c in self.optimized
+                          if c[0] == 'type' and not c[2]])
+
+    def testFocusingClicksAreDropped(self):
+        self.assertFalse(('click', 'id=id_steps-0-instruction', '')
+                         in self.optimized)
+        self.assertFalse(('click', 'id=id_steps-0-expected', '')
+                         in self.optimized)
+
+    def testClicksAddingStepRowsAreKept(self):
+        self.assertTrue(('click', 'id=id_steps-1-instruction', '')
+                        in self.optimized)
+
+    def testTagIsClickedWithoutWaiting(self):
+        link = 'link=music [tag]'
+        self.assertFalse(('waitForElementPresent', link, '')
+                         in self.optimized)
+        self.assertTrue(('click', link, '') in self.optimized)
+
+    def testFormIsStillOpenedAndSaved(self):
+        self.assertEqual(self.optimized[:2], self.commands[:2])
+        self.assertEqual(self.optimized[-2:], self.commands[-2:])
+
+    def testOptimizedProgramIsCheaper(self):
+        self.assertTrue(tcParser.commandsCost(self.optimized) <
+                        tcParser.commandsCost(self.commands))
+
+    def testOptimizerReport(self):
+        optimizer = tcParser.Optimizer()
+        optimizer.run('000000', self.commands)
+        report = optimizer.report()
+        self.assertEqual(report['removed'],
+                         len(self.commands) - len(self.optimized))
+        self.assertEqual(report['cases'][0]['name'], '000000')
+
+
+if __name__ == '__main__':
+    unittest.main()
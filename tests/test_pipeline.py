@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import tcParser
+from benchmarks import corpus
+from tests import TempFolder
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+        self.spec = corpus.write(self.tmp.join('spec'), cases=30,
+                                 unicodeMix=0.2)
+        self.fresh = tcParser.MemorySink()
+        tcParser.XhtmlParser(self.spec, self.fresh)
+
+    def tearDown(self):
+        self.tmp.close()
+
+    def generate(self, **options):
+        # the pipelined output must be the plain run's, byte for byte
+        out = self.tmp.join('out')
+        parser = tcParser.XhtmlParser(self.spec, out, pipeline=True,
+                                      **options)
+        for name in self.fresh.order:
+            f = open(self.tmp.join('out', name), 'rb')
+            self.assertEqual(f.read(), self.fresh.files[name], name)
+            f.close()
+        return parser.pipelineStats
+
+    def testBackgroundWriter(self):
+        self.assertEqual(self.generate()['written'], 30)
+
+    def testRenderThreads(self):
+        self.assertEqual(self.generate(renderers=3)['written'], 30)
+
+    def testProcessPool(self):
+        self.assertEqual(self.generate(renderers=2,
+                                       processes=True)['written'], 30)
+
+    def testQueueIsBounded(self):
+        stats = self.generate(queueSize=1)
+        self.assertTrue(stats['queue_max_depth'] <= 1)
+        self.assertEqual(stats['bytes'],
+                         sum([len(self.fresh.files[name]) for name
+                              in self.fresh.order if name != 'testSuite']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import tcExport
+from tests import TempFolder, spec
+
+TEXT = spec((u'one', [u'a'], [(u'tap', u'ok')]),
+            (u'två', [], [(u'swipe', u'gone')])) + \
+    spec((u'three', [u'b'], [(u'hold', u'menu')])).replace(
+        u'SUITE\nS\n', u'SUITE\nSmoke Tests\n')
+
+
+class PytestExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+        self.exporter = tcExport.PytestExport(lines=TEXT.splitlines(True),
+                                              folder=self.tmp.join('out'))
+
+    def tearDown(self):
+        self.tmp.close()
+
+    def testOneModulePerSuite(self):
+        self.assertEqual(sorted(os.listdir(self.tmp.join('out'))),
+                         ['conftest.py', 'test_s.py', 'test_smoke_tests.py'])
+        self.assertEqual(self.exporter.count, 3)
+
+    def testModulesCompile(self):
+        for path in self.exporter.files:
+            f = open(path, 'rb')
+            compile(f.read(), path, 'exec')
+            f.close()
+
+    def testIdsAreCaseFileNames(self):
+        module = self.tmp.read('out/test_s.py')
+        self.assertTrue(u"id=\"000000\"" in module)
+        self.assertTrue(u"id=\"000001\"" in module)
+        self.assertTrue(u"\"två\"" in module)
+        self.assertTrue(u"id=\"000002\"" in
+                        self.tmp.read('out/test_smoke_tests.py'))
+
+
+if __name__ == '__main__':
+    unittest.main()
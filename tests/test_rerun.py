@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import tcParser
+from tests import Rendered, TempFolder, spec
+
+CASES = [(u'one', [], [(u'tap', u'ok')]),
+         (u'two', [], [(u'swipe', u'ok')]),
+         (u'three', [], [(u'call', u'rings')])]
+
+
+class RerunFailedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+        self.spec = self.tmp.write('spec', spec(*CASES))
+        self.out = self.tmp.join('out')
+        tcParser.XhtmlParser(self.spec, self.out)
+
+    def tearDown(self):
+        self.tmp.close()
+
+    def rerun(self, text):
+        return tcParser.rerunFailed(self.spec, self.out,
+                                    [self.tmp.write('results.csv', text)])
+
+    def testFailedFileNames(self):
+        links = self.rerun(u'000000,1,passed\n000002,3,failed\n')
+        self.assertEqual(links, ['000002'])
+        suite = self.tmp.read('out/testSuite-failed')
+        self.assertTrue(u'href="000002"' in suite)
+        self.assertFalse(u'href="000000"' in suite)
+
+    def testFailedTitles(self):
+        self.assertEqual(self.rerun(u'two,2,error\nthree,3,passed\n'),
+                         ['000001'])
+
+    def testAfterResume(self):
+        cases = list(CASES)
+        cases[1] = (u'two', [], [(u'swipe left', u'ok')])
+        self.tmp.write('spec', spec(*cases))
+        tcParser.XhtmlParser(self.spec, self.out, resume=True)
+        self.assertEqual(self.rerun(u'000001,40,failed\n'), ['000001'])
+        self.assertEqual(self.rerun(u'two,40,failed\n'), ['000001'])
+
+    def testNothingIsRendered(self):
+        rendered = Rendered()
+        try:
+            self.rerun(u'000001,2,failed\n')
+        finally:
+            rendered.close()
+        self.assertEqual(rendered.names, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import tcParser
+from benchmarks import corpus
+from tests import Rendered, TempFolder
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+        # non-ASCII text: sizes in characters and bytes differ
+        self.spec = corpus.write(self.tmp.join('spec'), cases=20,
+                                 unicodeMix=0.3)
+        self.out = self.tmp.join('out')
+        tcParser.XhtmlParser(self.spec, self.out)
+        self.rendered = Rendered()
+
+    def tearDown(self):
+        self.rendered.close()
+        self.tmp.close()
+
+    def testJournalRecordsFileSizes(self):
+        entries = self.tmp.read('out/.journal').splitlines()
+        for line in entries[:-1]:
+            fn, digest, size, output = line.split('\t')
+            self.assertEqual(int(size),
+                             os.path.getsize(self.tmp.join('out', fn)))
+        self.assertEqual(entries[-1], 'SUITE\t20')
+
+    def testCompleteOutputIsSkipped(self):
+        tcParser.XhtmlParser(self.spec, self.out, resume=True)
+        self.assertEqual(self.rendered.names, [])
+
+    def testOnlyMissingAndTornFilesAreRendered(self):
+        os.remove(self.tmp.join('out', '000003'))
+        f = open(self.tmp.join('out', '000007'), 'ab')
+        f.write(b'torn')
+        f.close()
+        tcParser.XhtmlParser(self.spec, self.out, resume=True, pipeline=True)
+        self.assertEqual(sorted(self.rendered.names), ['000003', '000007'])
+
+    def testOtherOptionsRenderAgain(self):
+        tcParser.XhtmlParser(self.spec, self.out, resume=True, optimize=True)
+        self.assertEqual(len(self.rendered.names), 20)
+        del self.rendered.names[:]
+        tcParser.XhtmlParser(self.spec, self.out, resume=True, optimize=True)
+        self.assertEqual(self.rendered.names, [])
+
+    def testOutputDigestNamesTheRenderer(self):
+        case = tcParser.FileParser(self.spec).testcases[0]
+        slim = tcParser.XhtmlParser(renderer='slim')
+        pywlibs = tcParser.XhtmlParser(renderer='pywlibs')
+        self.assertNotEqual(slim.outputDigest(case),
+                            pywlibs.outputDigest(case))
+
+    def testResumedOutputMatchesAFreshRun(self):
+        os.remove(self.tmp.join('out', '000005'))
+        tcParser.XhtmlParser(self.spec, self.out, resume=True)
+        fresh = tcParser.MemorySink()
+        tcParser.XhtmlParser(self.spec, fresh)
+        for name in fresh.order:
+            f = open(self.tmp.join('out', name), 'rb')
+            self.assertEqual(f.read(), fresh.files[name], name)
+            f.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
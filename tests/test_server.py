@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+import unittest
+
+try:
+    from httplib import HTTPConnection
+except ImportError:
+    from http.client import HTTPConnection
+
+import tcServer
+from tests import spec
+
+SPEC = spec((u'first', [u'foo'], [(u'tap', u'done')]),
+            (u'second', [], [(u'tap', u'done')])).encode('utf-8')
+
+
+class ServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = tcServer.makeServer(port=0, workers=2)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.conn = HTTPConnection('127.0.0.1',
+                                   self.server.server_address[1], timeout=10)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, path):
+        self.conn.request('POST', path, SPEC)
+        response = self.conn.getresponse()
+        return response.status, response.read()
+
+    def testGenerate(self):
+        status, body = self.post('/generate?title=sec')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode('utf-8'))['order'],
+                         ['000000', 'testSuite'])
+
+    def testBadTitlePatternIsRejected(self):
+        status, body = self.post('/generate?title=(')
+        self.assertEqual(status, 400)
+        # the connection stays usable for the next request
+        status, body = self.post('/generate')
+        self.assertEqual(status, 200)
+        self.assertEqual(self.server.requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import tcParser
+
+
+class ShardTest(unittest.TestCase):
+
+    def testLongestFirstBalancesShards(self):
+        costs = [5, 5, 4, 4, 3, 3, 3, 8, 1]
+        shards = tcParser.shardCases(costs, 3)
+        self.assertEqual(sorted(sum(shards, [])), list(range(9)))
+        loads = sorted(sum(costs[i] for i in s) for s in shards)
+        self.assertEqual(loads, [12, 12, 12])
+
+    def testShardsKeepSpecOrder(self):
+        for shard in tcParser.shardCases([1, 9, 2, 8, 3], 2):
+            self.assertEqual(shard, sorted(shard))
+
+    def testMoreShardsThanCases(self):
+        self.assertEqual(tcParser.shardCases([1.0], 3), [[0], [], []])
+
+
+if __name__ == '__main__':
+    unittest.main()
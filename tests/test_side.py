@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+
+import tcExport
+from tests import TempFolder, spec
+
+TEXT = spec((u'one', [u'a'], [(u'tap', u'ok')]),
+            (u'två', [u'a'], [(u'swipe', u'gone')]),
+            (u'three', [], [(u'hold', u'menu')]))
+
+
+class SideExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+
+    def tearDown(self):
+        self.tmp.close()
+
+    def export(self, **options):
+        exporter = tcExport.SideExport(lines=TEXT.splitlines(True),
+                                       output=self.tmp.join('cases.side'),
+                                       **options)
+        projects = []
+        for path in exporter.files:
+            f = open(path, 'rb')
+            projects.append(json.loads(f.read().decode('ascii')))
+            f.close()
+        return exporter, projects
+
+    def testOneTestPerCase(self):
+        exporter, projects = self.export()
+        self.assertEqual(exporter.count, 3)
+        project = projects[0]
+        tests = dict((t['id'], t['name']) for t in project['tests'])
+        suite = project['suites'][0]
+        self.assertEqual([tests[t] for t in suite['tests']],
+                         [u'one [000000]', u'två [000001]',
+                          u'three [000002]'])
+
+    def testRepeatedBlocksAreShared(self):
+        exporter, projects = self.export()
+        names = [t['name'] for t in projects[0]['tests']]
+        self.assertEqual(sorted(n for n in names if n.startswith('tcParser:')),
+                         [u'tcParser: add tag a', u'tcParser: open case form',
+                          u'tcParser: save case'])
+        case = projects[0]['tests'][0]['commands']
+        self.assertEqual(case[0]['command'], 'run')
+        self.assertEqual(case[0]['target'], u'tcParser: open case form')
+
+    def testSplitProjectsCarryTheirSharedTests(self):
+        exporter, projects = self.export(splitSize=1)
+        self.assertEqual([p.split('/')[-1] for p in exporter.files],
+                         ['cases.side', 'cases-2.side', 'cases-3.side'])
+        for project in projects:
+            names = set(t['name'] for t in project['tests'])
+            for test in project['tests']:
+                for command in test['commands']:
+                    if command['command'] == 'run':
+                        self.assertTrue(command['target'] in names)
+
+
+if __name__ == '__main__':
+    unittest.main()
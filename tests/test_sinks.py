@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import tarfile
+import unittest
+import zipfile
+
+import tcParser
+from benchmarks import corpus
+from tests import TempFolder
+
+
+class SinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+        self.spec = corpus.write(self.tmp.join('spec'), cases=10,
+                                 unicodeMix=0.3)
+        self.memory = tcParser.MemorySink()
+        tcParser.XhtmlParser(self.spec, self.memory)
+
+    def tearDown(self):
+        self.tmp.close()
+
+    def testMemorySinkHoldsEveryFileInOrder(self):
+        self.assertEqual(self.memory.order,
+                         [str(i).zfill(6) for i in range(10)] + ['testSuite'])
+        for doc in self.memory.files.values():
+            self.assertTrue(isinstance(doc, bytes))
+
+    def testFolderSinkMatchesMemory(self):
+        tcParser.XhtmlParser(self.spec, self.tmp.join('out'))
+        names = sorted(n for n in os.listdir(self.tmp.join('out'))
+                       if n != '.journal')
+        self.assertEqual(names, sorted(self.memory.order))
+        for name in names:
+            f = open(self.tmp.join('out', name), 'rb')
+            self.assertEqual(f.read(), self.memory.files[name], name)
+            f.close()
+
+    def testStreamSinkFramesDocuments(self):
+        stream = io.BytesIO()
+        tcParser.XhtmlParser(self.spec, tcParser.StreamSink(stream))
+        data = stream.getvalue()
+        position = 0
+        names = []
+        while position < len(data):
+            end = data.index(b'\n', position)
+            name, size = data[position:end].decode('ascii').split('\t')
+            position = end + 1 + int(size)
+            self.assertEqual(data[end + 1:position], self.memory.files[name])
+            names.append(name)
+        self.assertEqual(names, self.memory.order)
+
+    def testZipArchive(self):
+        path = self.tmp.join('cases.zip')
+        tcParser.XhtmlParser(self.spec, tcParser.ArchiveSink(path))
+        archive = zipfile.ZipFile(path)
+        self.assertEqual(archive.namelist(), self.memory.order)
+        for name in self.memory.order:
+            self.assertEqual(archive.read(name), self.memory.files[name])
+        archive.close()
+
+    def testTarArchiveOnAFileObject(self):
+        buf = io.BytesIO()
+        tcParser.XhtmlParser(self.spec, tcParser.ArchiveSink(buf, 'tar.gz'))
+        archive = tarfile.open(fileobj=io.BytesIO(buf.getvalue()),
+                               mode='r:gz')
+        self.assertEqual(archive.getnames(), self.memory.order)
+        for name in self.memory.order:
+            f = archive.extractfile(name)
+            self.assertEqual(f.read(), self.memory.files[name])
+            f.close()
+        archive.close()
+
+    def testArchiveFormatFollowsTheName(self):
+        self.assertEqual(tcParser.ArchiveSink.format('a.tgz'), 'tar.gz')
+        self.assertEqual(tcParser.ArchiveSink.format('a.zip'), 'zip')
+        self.assertEqual(tcParser.ArchiveSink.format('out'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+try:
+    from urlparse import urlparse, parse_qsl
+except ImportError:
+    from urllib.parse import urlparse, parse_qsl
+
+import tcUpload
+from benchmarks import moztrap
+from tests import TempFolder, spec, parse
+
+CASES = [(u'one', [u'a'], [(u'tap', u'ok'), (u'swipe', u'gone')]),
+         (u'two', [u'a', u'b'], [(u'call', u'rings')])]
+
+
+class StoreClient:
+    """Stands in for tcUpload.Client, answering from a moztrap Store.
+
+    The first POST of each kind in ``lose`` is applied and then fails
+    ambiguously, like an answer lost behind a proxy.
+    """
+
+    retries = 3
+
+    def __init__(self, store, lose=()):
+        self.store = store
+        self.lose = list(lose)
+        self.requests = 0
+        self.retried = 0
+
+    def request(self, method, path, body=None, headers=None, retry=True):
+        url = urlparse(path)
+        kind = url.path[len(tcUpload.API):].strip('/')
+        query = dict(parse_qsl(url.query))
+        self.requests += 1
+        if method == 'GET':
+            if kind in moztrap.LOOKUPS:
+                return {'objects': [{'resource_uri':
+                                     self.store.lookup(kind, query)}]}
+            return {'objects': self.store.filter(kind, query)}
+        uri, error = self.store.create(kind, body)
+        if error:
+            raise tcUpload.UploadError(error)
+        if kind in self.lose:
+            self.lose.remove(kind)
+            raise tcUpload.AmbiguousError("POST %s: None lost" % path)
+        return {'resource_uri': uri}
+
+    def pause(self, attempt, delay=None):
+        self.retried += 1
+
+    def close(self):
+        pass
+
+
+class UploaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+        self.fresh()
+
+    def fresh(self):
+        # an empty server and ledger
+        self.store = moztrap.Store()
+        open(self.tmp.join('ledger'), 'w').close()
+
+    def tearDown(self):
+        self.tmp.close()
+
+    def upload(self, cases, lose=()):
+        ledger = tcUpload.Ledger(self.tmp.join('ledger'), 'http://stub')
+        try:
+            return tcUpload.Uploader(StoreClient(self.store, lose),
+                                     ledger, 2).upload(cases)
+        finally:
+            ledger.close()
+
+    def steps(self, version):
+        return [(s['number'], s['instruction'])
+                for s in self.store.filter('casestep',
+                                           {'caseversion':
+                                            tcUpload.uriId(version)})]
+
+    def testEveryObjectOnce(self):
+        cases = parse(spec(*CASES))
+        self.assertEqual(self.upload(cases)['sent'], 2)
+        self.assertEqual(self.store.check(cases), [])
+        self.assertEqual(len(self.store.objects['tag']), 2)
+        self.assertEqual(self.upload(cases)['sent'], 0)
+
+    def testLostAnswersAreResolved(self):
+        for kind in ('case', 'caseversion', 'casestep', 'suitecase'):
+            self.fresh()
+            cases = parse(spec(*CASES))
+            result = self.upload(cases, [kind])
+            self.assertEqual(result['resolved'], 1, kind)
+            self.assertEqual(self.store.check(cases), [], kind)
+
+    def testCopiesOfACase(self):
+        cases = parse(spec(CASES[0], CASES[0]))
+        self.upload(cases, ['caseversion'])
+        self.assertEqual(self.store.check(cases), [])
+
+    def testEditedCaseIsNotTakenForItsOldUpload(self):
+        edited = (u'one', [u'a'], [(u'tap twice', u'ok')])
+        for kind in ('case', 'caseversion'):
+            self.fresh()
+            self.upload(parse(spec(CASES[0])))
+            self.upload(parse(spec(edited)), [kind])
+            old, new = [v['resource_uri']
+                        for v in self.store.objects['caseversion']]
+            self.assertEqual(self.steps(old), [(1, u'tap\n'), (2, u'swipe\n')])
+            self.assertEqual(self.steps(new), [(1, u'tap twice\n')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+import tcParser
+from tests import Rendered, TempFolder, spec
+
+CASES = [(u'one', [u'a'], [(u'tap', u'ok')]),
+         (u'two', [u'b'], [(u'swipe', u'ok')]),
+         (u'thr\xe9e', [u'a'], [(u'call', u'rings')])]
+
+
+class WatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = TempFolder()
+        self.spec = self.tmp.write('spec', spec(*CASES))
+        self.out = self.tmp.join('out')
+        tcParser.XhtmlParser(self.spec, self.out, suitesBy=['tag'])
+        self.watcher = tcParser.Watcher(self.spec, self.out,
+                                        suitesBy=['tag'])
+        self.rendered = Rendered()
+
+    def tearDown(self):
+        self.rendered.close()
+        self.watcher.journal.close()
+        self.tmp.close()
+
+    def testFirstUpdateRendersNothing(self):
+        self.watcher.update()
+        self.assertEqual(self.rendered.names, [])
+
+    def testOnlyTheChangedCaseIsRendered(self):
+        self.watcher.update()
+        cases = list(CASES)
+        cases[1] = (u'two', [u'b'], [(u'swipe left', u'ok')])
+        self.tmp.write('spec', spec(*cases))
+        self.watcher.update()
+        self.assertEqual(self.rendered.names, ['000001'])
+        self.assertTrue(u'swipe left' in self.tmp.read('out/000001'))
+
+    def testRemovedCasesAndSuitesAreDeleted(self):
+        self.watcher.update()
+        self.tmp.write('spec', spec(*CASES[:1]))
+        self.watcher.update()
+        names = sorted(os.listdir(self.out))
+        self.assertEqual(names, ['.journal', '000000', 'testSuite',
+                                 'testSuite-tag-a'])
+        self.assertFalse(u'000002' in self.tmp.read('out/testSuite'))
+
+    def testOutputMatchesAFreshRun(self):
+        cases = CASES + [(u'four', [u'c'], [])]
+        self.tmp.write('spec', spec(*cases))
+        self.watcher.update()
+        fresh = tcParser.MemorySink()
+        tcParser.XhtmlParser(self.spec, fresh, suitesBy=['tag'])
+        self.assertEqual(sorted(fresh.order),
+                         sorted(n for n in os.listdir(self.out)
+                                if n != '.journal'))
+        for name in fresh.order:
+            self.assertEqual(self.tmp.read('out/' + name),
+                             fresh.files[name].decode('utf-8'), name)
+
+
+if __name__ == '__main__':
+    unittest.main()